@@ -0,0 +1,146 @@
+"""Idle-connection memory and message latency: threading vs asyncio mode.
+
+For each server mode, opens --idle WebSocket connections that only join and
+then sit idle, records the server's RSS growth per connection, and measures
+chat message latency between --pairs active client pairs while the idle
+connections stay open.
+
+Usage:
+  python benchmarks/bench_async_mode.py --idle 2000
+  python benchmarks/bench_async_mode.py --modes asgi --idle 10000
+"""
+import argparse
+import asyncio
+import resource
+import time
+
+import socketio
+
+from common import (ASGI_SERVER_BOOT, SERVER_BOOT, ServerProcess, percentile,
+                    proc_cpu_seconds, proc_memory_kb)
+
+MODES = {
+    'threading': SERVER_BOOT,
+    'asgi': ASGI_SERVER_BOOT,
+}
+
+
+async def connect_idle(url, count, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    clients = []
+
+    async def connect(user_id):
+        client = socketio.AsyncClient(reconnection=False)
+        async with semaphore:
+            await client.connect(url, transports=['websocket'])
+            await client.emit('join', {'user_id': user_id})
+        clients.append(client)
+
+    results = await asyncio.gather(*(connect(100000 + i) for i in range(count)),
+                                   return_exceptions=True)
+    failed = sum(1 for r in results if isinstance(r, Exception))
+    return clients, failed
+
+
+async def measure_latency(url, pairs, messages, timeout):
+    latencies = []
+    expected = pairs * 2 * messages
+    done = asyncio.Event()
+    clients = []
+
+    for user_id in range(pairs * 2):
+        client = socketio.AsyncClient(reconnection=False)
+
+        @client.on('new_message')
+        async def on_message(data):
+            latencies.append(time.perf_counter() - float(data['content']))
+            if len(latencies) >= expected:
+                done.set()
+
+        await client.connect(url, transports=['websocket'])
+        await client.emit('join', {'user_id': user_id})
+        clients.append((user_id, client))
+
+    await asyncio.sleep(0.5)
+    for _ in range(messages):
+        for user_id, client in clients:
+            await client.emit('send_message', {'sender_id': user_id, 'receiver_id': user_id ^ 1,
+                                               'content': repr(time.perf_counter())})
+        # Stay inside the default send_message budget
+        await asyncio.sleep(0.2)
+    try:
+        await asyncio.wait_for(done.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    await asyncio.gather(*(c.disconnect() for _, c in clients), return_exceptions=True)
+    return latencies, expected
+
+
+async def run_mode(server, args):
+    pid = server.proc.pid
+    rss_before, _ = proc_memory_kb(pid)
+
+    started = time.perf_counter()
+    idle, failed = await connect_idle(server.url, args.idle, args.connect_concurrency)
+    connect_seconds = time.perf_counter() - started
+    await asyncio.sleep(2)  # let the server settle
+
+    rss_idle, _ = proc_memory_kb(pid)
+    cpu_before = proc_cpu_seconds(pid)
+    latencies, expected = await measure_latency(server.url, args.pairs, args.messages, args.timeout)
+    cpu = proc_cpu_seconds(pid) - cpu_before
+    _, peak = proc_memory_kb(pid)
+
+    await asyncio.gather(*(c.disconnect() for c in idle), return_exceptions=True)
+    connected = len(idle)
+    return {
+        'connected': connected,
+        'failed': failed,
+        'connect_seconds': connect_seconds,
+        'rss_before_kb': rss_before,
+        'rss_idle_kb': rss_idle,
+        'kb_per_connection': (rss_idle - rss_before) / connected if connected else 0.0,
+        'peak_rss_kb': peak,
+        'messages': len(latencies),
+        'lost': expected - len(latencies),
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'cpu_seconds': cpu,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+    parser.add_argument('--idle', type=int, default=1000, help='idle connections to hold open')
+    parser.add_argument('--pairs', type=int, default=10, help='active chat pairs')
+    parser.add_argument('--messages', type=int, default=10, help='messages per active client')
+    parser.add_argument('--connect-concurrency', type=int, default=100)
+    parser.add_argument('--timeout', type=float, default=60.0)
+    args = parser.parse_args()
+
+    # Every idle client holds a socket here too
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = min(hard, args.idle * 2 + 1024)
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+    results = {}
+    for mode in args.modes:
+        print(f"🚀 {mode}: {args.idle} idle connections, {args.pairs} active pairs")
+        with ServerProcess(boot=MODES[mode]) as server:
+            results[mode] = asyncio.run(run_mode(server, args))
+
+    print(f"\n{'mode':<10} {'idle conns':>10} {'KB/conn':>8} {'peak RSS':>10} "
+          f"{'p50':>9} {'p99':>9} {'lost':>5}")
+    print("-" * 68)
+    for mode, r in results.items():
+        print(f"{mode:<10} {r['connected']:>10} {r['kb_per_connection']:>8.1f} "
+              f"{r['peak_rss_kb'] / 1024:>8.1f}MB {r['p50_ms']:>7.2f}ms {r['p99_ms']:>7.2f}ms "
+              f"{r['lost']:>5}")
+        if r['failed']:
+            print(f"   ⚠️  {r['failed']} idle connections failed to connect")
+
+
+if __name__ == '__main__':
+    main()
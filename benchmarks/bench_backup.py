@@ -0,0 +1,131 @@
+"""Online backup and restore timings for a large chat database.
+
+Builds a messages database of --size-mb, then runs app.backup_database() while
+a writer thread keeps inserting messages, reporting the backup duration, how
+often SQLite restarted the copy, and the worst insert stall the writer saw.
+Finally times restore_db_from_backup() into an empty location.
+
+Usage:
+  python benchmarks/bench_backup.py --size-mb 500
+  python benchmarks/bench_backup.py --size-mb 4096 --pages-per-step 4096
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from common import PROJECT_ROOT, percentile
+
+ROW_CONTENT = 'x' * 200
+
+
+def build_database(path, size_mb):
+    """Fill path with users/messages rows until it reaches size_mb"""
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sender_id INTEGER,
+            receiver_id INTEGER,
+            content TEXT,
+            message_type TEXT DEFAULT 'text',
+            file_path TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    target = size_mb * 1024 * 1024
+    batch = [(i % 1000, (i + 1) % 1000, ROW_CONTENT, 'text', None) for i in range(50000)]
+    while os.path.getsize(path) < target:
+        conn.executemany('INSERT INTO messages (sender_id, receiver_id, content, message_type, file_path) '
+                         'VALUES (?, ?, ?, ?, ?)', batch)
+        conn.commit()
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.close()
+
+
+def writer(path, stop, stalls):
+    """Insert one chat message at a time, like send_message, recording each insert's latency"""
+    conn = sqlite3.connect(path, timeout=30)
+    while not stop.is_set():
+        started = time.perf_counter()
+        conn.execute('INSERT INTO messages (sender_id, receiver_id, content) VALUES (1, 2, ?)',
+                     (ROW_CONTENT,))
+        conn.commit()
+        stalls.append(time.perf_counter() - started)
+        time.sleep(0.01)
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size-mb', type=int, default=500)
+    parser.add_argument('--pages-per-step', type=int, default=1024)
+    parser.add_argument('--step-sleep', type=float, default=0.005)
+    parser.add_argument('--workdir', help='directory for the test databases (default: temp dir)')
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='chat_backup_bench_')
+    db_path = os.path.join(workdir, 'live.db')
+    backup_path = os.path.join(workdir, 'backup.db')
+    restored_path = os.path.join(workdir, 'restored.db')
+
+    # app.py reads its configuration from the environment at import time
+    os.environ.update(DATABASE_PATH=restored_path, DATABASE_BACKUP_PATH=backup_path)
+    sys.path.insert(0, PROJECT_ROOT)
+
+    try:
+        if not os.path.exists(db_path):
+            print(f"🔧 Building {args.size_mb} MB database in {workdir} ...")
+            started = time.time()
+            build_database(db_path, args.size_mb)
+            print(f"   done in {time.time() - started:.1f}s")
+        size = os.path.getsize(db_path)
+
+        from source.server import app as chat_app
+
+        stop = threading.Event()
+        stalls = []
+        thread = threading.Thread(target=writer, args=(db_path, stop, stalls))
+        thread.start()
+        try:
+            stats = chat_app.backup_database(db_path, backup_path,
+                                             args.pages_per_step, args.step_sleep)
+        finally:
+            stop.set()
+            thread.join()
+
+        print(f"\n💾 Online backup of {size / 1024 ** 2:,.0f} MB")
+        print(f"   time:        {stats['seconds']:.2f}s ({size / 1024 ** 2 / stats['seconds']:,.0f} MB/s)")
+        print(f"   pages/steps: {stats['pages']:,} / {stats['steps']:,}, restarts: {stats['restarts']}")
+        print(f"   writer:      {len(stalls)} inserts during backup, "
+              f"p50 {percentile(stalls, 50) * 1000:.2f}ms, "
+              f"p99 {percentile(stalls, 99) * 1000:.2f}ms, max {max(stalls, default=0) * 1000:.2f}ms")
+
+        started = time.time()
+        chat_app.restore_db_from_backup()
+        print(f"\n♻️  Restore at startup: {time.time() - started:.2f}s")
+        conn = sqlite3.connect(restored_path)
+        rows = conn.execute('SELECT COUNT(*) FROM messages').fetchone()[0]
+        conn.close()
+        print(f"   restored database has {rows:,} messages")
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
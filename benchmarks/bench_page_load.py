@@ -0,0 +1,128 @@
+"""Page-load bytes and server CPU per page view for / and /chat.
+
+For each server configuration (PAGE_CACHE on and off) and each Accept-Encoding,
+simulates --views page views of both pages: a first visit that downloads the
+page and every /assets/ file it links, and a repeat visit that revalidates the
+page with If-None-Match and reuses the (immutable, hashed) assets from the
+browser cache. Reports response body bytes per view, server CPU per view and
+request latency.
+
+Usage:
+  python benchmarks/bench_page_load.py
+  python benchmarks/bench_page_load.py --views 500 --encodings br gzip identity
+"""
+import argparse
+import gzip
+import re
+import time
+import urllib.error
+import urllib.request
+
+from common import ServerProcess, percentile, proc_cpu_seconds
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PAGES = ['/', '/chat']
+ASSET_LINK = re.compile(r'(?:src|href)="(/assets/[^"]+)"')
+ACCEPT_ENCODING = {'br': 'br, gzip', 'gzip': 'gzip', 'identity': 'identity'}
+DECODERS = {'gzip': gzip.decompress, 'br': brotli.decompress if brotli else None}
+
+
+def fetch(url, headers):
+    """(status, body bytes as sent, response headers, seconds)"""
+    started = time.perf_counter()
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.read(), response.headers, time.perf_counter() - started
+    except urllib.error.HTTPError as e:  # 304 Not Modified
+        return e.code, e.read(), e.headers, time.perf_counter() - started
+
+
+def page_view(base_url, path, encoding, browser_cache, latencies):
+    """One page view; browser_cache maps URL -> ETag. Returns bytes received."""
+    headers = {'Accept-Encoding': ACCEPT_ENCODING[encoding]}
+    page_url = base_url + path
+    if page_url in browser_cache:
+        headers['If-None-Match'] = browser_cache[page_url]
+    status, body, response_headers, seconds = fetch(page_url, headers)
+    latencies.append(seconds)
+    received = len(body)
+    if status == 304:
+        return received
+    browser_cache[page_url] = response_headers.get('ETag')
+
+    content_encoding = response_headers.get('Content-Encoding')
+    html = (DECODERS[content_encoding](body) if content_encoding else body).decode()
+    for asset in ASSET_LINK.findall(html):
+        asset_url = base_url + asset
+        cache_control = browser_cache.get(asset_url + '#cache-control', '')
+        if 'immutable' in cache_control:
+            continue
+        asset_headers = {'Accept-Encoding': ACCEPT_ENCODING[encoding]}
+        if asset_url in browser_cache:
+            asset_headers['If-None-Match'] = browser_cache[asset_url]
+        status, body, response_headers, seconds = fetch(asset_url, asset_headers)
+        latencies.append(seconds)
+        received += len(body)
+        if status == 200:
+            browser_cache[asset_url] = response_headers.get('ETag')
+            browser_cache[asset_url + '#cache-control'] = response_headers.get('Cache-Control', '')
+    return received
+
+
+def run(server, encoding, views):
+    first_bytes = sum(page_view(server.url, path, encoding, {}, []) for path in PAGES)
+
+    browser_cache = {}
+    for path in PAGES:
+        page_view(server.url, path, encoding, browser_cache, [])
+    repeat_bytes = sum(page_view(server.url, path, encoding, browser_cache, []) for path in PAGES)
+
+    # Server CPU per view: fresh and repeat visits alternate like real traffic
+    latencies = []
+    cpu_before = proc_cpu_seconds(server.proc.pid)
+    for i in range(views):
+        cache = browser_cache if i % 2 else {}
+        for path in PAGES:
+            page_view(server.url, path, encoding, cache, latencies)
+    cpu = proc_cpu_seconds(server.proc.pid) - cpu_before
+    return {
+        'first_visit_bytes': first_bytes,
+        'repeat_visit_bytes': repeat_bytes,
+        'cpu_ms_per_view': cpu * 1000 / (views * len(PAGES)),
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--views', type=int, default=200, help='page views per configuration')
+    parser.add_argument('--encodings', nargs='+', choices=list(ACCEPT_ENCODING),
+                        default=list(ACCEPT_ENCODING))
+    args = parser.parse_args()
+    if brotli is None and 'br' in args.encodings:
+        parser.error("the br encoding needs the brotli package (pip install brotli)")
+
+    results = []
+    for page_cache in ('0', '1'):
+        with ServerProcess(env={'PAGE_CACHE': page_cache}) as server:
+            for encoding in args.encodings:
+                print(f"🚀 PAGE_CACHE={page_cache}, {encoding}: {args.views} views of {' '.join(PAGES)}")
+                results.append((page_cache, encoding, run(server, encoding, args.views)))
+
+    print(f"\n{'cache':<6} {'encoding':<9} {'first visit':>12} {'repeat visit':>13} "
+          f"{'CPU/view':>9} {'p50':>8} {'p99':>8}")
+    print("-" * 72)
+    for page_cache, encoding, r in results:
+        print(f"{'on' if page_cache == '1' else 'off':<6} {encoding:<9} {r['first_visit_bytes']:>10,} B "
+              f"{r['repeat_visit_bytes']:>11,} B {r['cpu_ms_per_view']:>7.2f}ms "
+              f"{r['p50_ms']:>6.2f}ms {r['p99_ms']:>6.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""Bytes on the wire per call setup and per chat message.
+
+Encodes the events app.py exchanges with the same packet classes the server
+uses (JSON text or msgpack binary), adds Engine.IO and WebSocket framing, and
+optionally runs them through permessage-deflate with context takeover the way
+browsers negotiate it. Runs fully offline, no server needed.
+
+Usage:
+  python benchmarks/bench_payload_size.py
+  python benchmarks/bench_payload_size.py --candidates 10 --sdp-bytes 6000
+"""
+import argparse
+import zlib
+
+from socketio import packet
+
+from bench_signaling import fake_candidate, fake_sdp
+
+try:
+    from socketio import msgpack_packet
+except ImportError:  # msgpack not installed
+    msgpack_packet = None
+
+
+def websocket_frame_size(payload_len, masked):
+    """RFC 6455 frame overhead: clients mask their frames, servers do not"""
+    header = 2
+    if payload_len > 65535:
+        header += 8
+    elif payload_len > 125:
+        header += 2
+    return header + (4 if masked else 0) + payload_len
+
+
+class Wire:
+    """Counts the bytes of one WebSocket connection in both directions"""
+
+    def __init__(self, serializer, deflate):
+        self.packet_class = msgpack_packet.MsgPackPacket if serializer == 'msgpack' else packet.Packet
+        self.deflate = deflate
+        # permessage-deflate keeps one raw-deflate stream per direction
+        self.compressors = {
+            'up': zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15),
+            'down': zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15),
+        }
+
+    def encode(self, event, data):
+        encoded = self.packet_class(packet.EVENT, data=[event, data]).encode()
+        if isinstance(encoded, str):
+            # Engine.IO "message" packet type prefix on a text frame
+            return ('4' + encoded).encode('utf-8')
+        return encoded
+
+    def send(self, direction, event, data):
+        payload = self.encode(event, data)
+        if self.deflate:
+            compressor = self.compressors[direction]
+            # Sync-flushed block without its trailing 00 00 ff ff (RFC 7692)
+            payload = (compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH))[:-4]
+        return websocket_frame_size(len(payload), masked=(direction == 'up'))
+
+
+def call_setup_bytes(serializer, deflate, candidates, sdp_bytes):
+    """Caller + callee traffic for call_user .. last ICE candidate"""
+    caller, callee = Wire(serializer, deflate), Wire(serializer, deflate)
+    sdp = fake_sdp(sdp_bytes)
+    call = {'caller_id': 1, 'receiver_id': 2, 'caller_name': 'alice'}
+    offer = {'type': 'offer', 'sdp': sdp}
+    answer = {'type': 'answer', 'sdp': sdp}
+
+    total = 0
+    # caller -> server -> callee for each relayed event, and back again
+    total += caller.send('up', 'call_user', call) + callee.send('down', 'incoming_call', call)
+    total += callee.send('up', 'call_accepted', call) + caller.send('down', 'call_accepted', call)
+    total += caller.send('up', 'offer', offer) + callee.send('down', 'offer', offer)
+    total += callee.send('up', 'answer', answer) + caller.send('down', 'answer', answer)
+    for i in range(candidates):
+        candidate = fake_candidate(i)
+        total += caller.send('up', 'ice-candidate', candidate) + callee.send('down', 'ice-candidate', candidate)
+        candidate = fake_candidate(i + 100)
+        total += callee.send('up', 'ice-candidate', candidate) + caller.send('down', 'ice-candidate', candidate)
+    return total
+
+
+def chat_message_bytes(serializer, deflate, messages):
+    """Average sender + receiver traffic for one text message"""
+    sender, receiver = Wire(serializer, deflate), Wire(serializer, deflate)
+    total = 0
+    for i in range(messages):
+        outgoing = {'sender_id': 1, 'receiver_id': 2, 'content': f'Hello Bob, this is message {i}!',
+                    'message_type': 'text', 'client_message_id': f'lq3x9a{i:04d}k2'}
+        delivered = {'id': 1000 + i, 'sender_id': 1, 'receiver_id': 2,
+                     'content': outgoing['content'], 'message_type': 'text', 'file_path': None,
+                     'sender_name': 'alice', 'created_at': '2024-05-01T10:15:30.123456'}
+        total += sender.send('up', 'send_message', outgoing)
+        total += receiver.send('down', 'new_message', delivered)
+    return total / messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--candidates', type=int, default=5, help='ICE candidates per peer')
+    parser.add_argument('--sdp-bytes', type=int, default=3000)
+    parser.add_argument('--messages', type=int, default=100,
+                        help='messages per connection (deflate improves as context builds up)')
+    args = parser.parse_args()
+
+    serializers = ['default'] + (['msgpack'] if msgpack_packet else [])
+    if not msgpack_packet:
+        print("⚠️  msgpack is not installed, only measuring the JSON serializer")
+
+    print(f"{'serializer':<10} {'deflate':<8} {'call setup':>12} {'chat message':>14}")
+    print("-" * 48)
+    baseline = None
+    for serializer in serializers:
+        for deflate in (False, True):
+            call = call_setup_bytes(serializer, deflate, args.candidates, args.sdp_bytes)
+            chat = chat_message_bytes(serializer, deflate, args.messages)
+            baseline = baseline or (call, chat)
+            print(f"{serializer:<10} {'on' if deflate else 'off':<8} "
+                  f"{call:>9,} B {100 * call / baseline[0]:>3.0f}%"
+                  f"{chat:>9.0f} B {100 * chat / baseline[1]:>3.0f}%")
+
+
+if __name__ == '__main__':
+    main()
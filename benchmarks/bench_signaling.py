@@ -0,0 +1,320 @@
+"""Signaling and chat load test for source/server/app.py.
+
+Starts the server locally with a throwaway database, connects many Socket.IO
+clients from one asyncio process and drives the same events the browser sends:
+
+  join          -> user_status_changed (broadcast)
+  send_message  -> new_message
+  call_user     -> incoming_call -> call_accepted
+  offer/answer/ice-candidate (broadcast relay)
+
+For every phase it reports throughput, p50/p99 latency and the server's CPU
+time and memory, and can fail the run when a saved baseline regresses.
+
+Usage:
+  python benchmarks/bench_signaling.py --clients 1000
+  python benchmarks/bench_signaling.py --json-out bench.json
+  python benchmarks/bench_signaling.py --baseline bench.json --tolerance 0.2
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import socketio
+
+from common import (ServerProcess, compare_with_baseline, percentile,
+                    proc_cpu_seconds, proc_memory_kb)
+
+
+def fake_sdp(size=3000):
+    """SDP-shaped text of roughly size bytes"""
+    lines = ['v=0', 'o=- 4611731400430051336 2 IN IP4 127.0.0.1', 's=-', 't=0 0',
+             'a=group:BUNDLE 0 1', 'm=audio 9 UDP/TLS/RTP/SAVPF 111 63 103 104 9 0 8',
+             'c=IN IP4 0.0.0.0']
+    i = 0
+    while sum(len(l) + 2 for l in lines) < size:
+        lines.append(f'a=rtpmap:{96 + i % 30} VP8/90000 a=rtcp-fb:{96 + i % 30} nack pli')
+        i += 1
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def fake_candidate(i):
+    return {
+        'candidate': f'candidate:{i} 1 udp 2122260223 192.168.1.{i % 250} {50000 + i} typ host generation 0',
+        'sdpMid': '0',
+        'sdpMLineIndex': 0,
+    }
+
+
+class Phase:
+    """Collects latencies for one benchmark phase until expected events arrive"""
+
+    def __init__(self, name, expected):
+        self.name = name
+        self.expected = expected
+        self.latencies = []
+        self.deliveries = 0
+        self.done = asyncio.Event()
+        if expected == 0:
+            self.done.set()
+
+    def record(self, sent_at):
+        self.latencies.append(time.perf_counter() - sent_at)
+        if len(self.latencies) >= self.expected:
+            self.done.set()
+
+
+class BenchClient:
+    """One simulated browser tab"""
+
+    def __init__(self, user_id, bench):
+        self.user_id = user_id
+        self.bench = bench
+        self.sio = socketio.AsyncClient(reconnection=False, serializer=bench.args.serializer)
+        self.sio.on('user_status_changed', self.on_status)
+        self.sio.on('new_message', self.on_message)
+        self.sio.on('incoming_call', self.on_incoming_call)
+        self.sio.on('call_accepted', self.on_call_accepted)
+        self.sio.on('offer', self.on_offer)
+        self.sio.on('answer', self.on_answer)
+        self.sio.on('ice-candidate', self.on_candidate)
+
+    @property
+    def partner_id(self):
+        return self.user_id ^ 1
+
+    async def on_status(self, data):
+        if data.get('user_id') == self.user_id and data.get('status') == 'online':
+            self.bench.current.record(self.bench.join_sent[self.user_id])
+
+    async def on_message(self, data):
+        _, sent_at = data['content'].split(':', 1)
+        self.bench.current.record(float(sent_at))
+
+    async def on_incoming_call(self, data):
+        await self.sio.emit('call_accepted', {'caller_id': data['caller_id'],
+                                              'receiver_id': self.user_id,
+                                              'sent_at': data['sent_at']})
+
+    async def on_call_accepted(self, data):
+        self.bench.current.record(data['sent_at'])
+
+    async def on_offer(self, data):
+        phase = self.bench.current
+        phase.deliveries += 1
+        if data.get('target') == self.user_id:
+            phase.record(data['sent_at'])
+            await self.sio.emit('answer', {'target': data['from'], 'from': self.user_id,
+                                           'sdp': data['sdp'], 'type': 'answer',
+                                           'sent_at': time.perf_counter()})
+
+    async def on_answer(self, data):
+        phase = self.bench.current
+        phase.deliveries += 1
+        if data.get('target') == self.user_id:
+            phase.record(data['sent_at'])
+
+    async def on_candidate(self, data):
+        phase = self.bench.current
+        phase.deliveries += 1
+        if data.get('target') == self.user_id:
+            phase.record(data['sent_at'])
+
+
+class SignalingBench:
+    def __init__(self, args, server):
+        self.args = args
+        self.server = server
+        self.clients = []
+        self.current = None
+        self.join_sent = {}
+        self.results = {'config': vars(args), 'phases': {}, 'server': {}}
+
+    async def run_phase(self, name, expected, driver):
+        """Run driver() and wait until expected latency samples were recorded"""
+        self.current = Phase(name, expected)
+        pid = self.server.proc.pid
+        cpu_before = proc_cpu_seconds(pid)
+        started = time.perf_counter()
+        await driver()
+        try:
+            await asyncio.wait_for(self.current.done.wait(), self.args.timeout)
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.perf_counter() - started
+        cpu = proc_cpu_seconds(pid) - cpu_before
+        rss, _ = proc_memory_kb(pid)
+
+        phase = self.current
+        received = len(phase.latencies)
+        stats = {
+            'expected': expected,
+            'received': received,
+            'lost': expected - received,
+            'relay_deliveries': phase.deliveries,
+            'seconds': elapsed,
+            'throughput': received / elapsed if elapsed else 0.0,
+            'p50_ms': percentile(phase.latencies, 50) * 1000,
+            'p99_ms': percentile(phase.latencies, 99) * 1000,
+            'max_ms': max(phase.latencies, default=0.0) * 1000,
+            'cpu_seconds': cpu,
+            'cpu_percent': 100.0 * cpu / elapsed if elapsed else 0.0,
+            'rss_kb': rss,
+        }
+        self.results['phases'][name] = stats
+        print(f"{name:<12} {received:>7}/{expected:<7} {stats['throughput']:>9.0f}/s "
+              f"p50 {stats['p50_ms']:>7.2f}ms  p99 {stats['p99_ms']:>8.2f}ms  "
+              f"cpu {stats['cpu_percent']:>5.0f}%  rss {rss / 1024:>6.1f}MB")
+
+    async def connect_all(self):
+        semaphore = asyncio.Semaphore(self.args.connect_concurrency)
+        transports = ['websocket'] if self.args.transport == 'websocket' else ['polling']
+
+        async def connect(client):
+            async with semaphore:
+                await client.sio.connect(self.server.url, transports=transports)
+
+        self.clients = [BenchClient(i, self) for i in range(self.args.clients)]
+        started = time.perf_counter()
+        await asyncio.gather(*(connect(c) for c in self.clients))
+        elapsed = time.perf_counter() - started
+        self.results['phases']['connect'] = {
+            'expected': len(self.clients), 'received': len(self.clients), 'lost': 0,
+            'relay_deliveries': 0, 'seconds': elapsed,
+            'throughput': len(self.clients) / elapsed if elapsed else 0.0,
+            'p50_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0, 'cpu_seconds': 0.0,
+            'cpu_percent': 0.0, 'rss_kb': proc_memory_kb(self.server.proc.pid)[0],
+        }
+        print(f"{'connect':<12} {len(self.clients):>7} clients in {elapsed:.2f}s")
+
+    async def phase_join(self):
+        async def drive():
+            for client in self.clients:
+                self.join_sent[client.user_id] = time.perf_counter()
+                await client.sio.emit('join', {'user_id': client.user_id})
+        await self.run_phase('join', len(self.clients), drive)
+
+    async def phase_chat(self):
+        count = self.args.messages
+
+        async def drive():
+            for n in range(count):
+                for client in self.clients:
+                    await client.sio.emit('send_message', {
+                        'sender_id': client.user_id,
+                        'receiver_id': client.partner_id,
+                        'content': f'bench-{n}:{time.perf_counter()!r}',
+                        'message_type': 'text',
+                    })
+        await self.run_phase('chat', len(self.clients) * count, drive)
+
+    async def phase_call(self):
+        callers = self.clients[::2]
+
+        async def drive():
+            for client in callers:
+                await client.sio.emit('call_user', {'caller_id': client.user_id,
+                                                    'receiver_id': client.partner_id,
+                                                    'sent_at': time.perf_counter()})
+        await self.run_phase('call_setup', len(callers), drive)
+
+    async def phase_signaling(self):
+        callers = self.clients[::2][:self.args.signaling_pairs]
+        candidates = self.args.candidates
+        sdp = fake_sdp(self.args.sdp_bytes)
+
+        async def drive():
+            for client in callers:
+                await client.sio.emit('offer', {'target': client.partner_id, 'from': client.user_id,
+                                                'sdp': sdp, 'type': 'offer',
+                                                'sent_at': time.perf_counter()})
+                for i in range(candidates):
+                    await client.sio.emit('ice-candidate', {'target': client.partner_id,
+                                                            'from': client.user_id,
+                                                            'candidate': fake_candidate(i),
+                                                            'sent_at': time.perf_counter()})
+        # offer + answer + candidates reach their intended peer once each
+        await self.run_phase('signaling', len(callers) * (2 + candidates), drive)
+
+    async def run(self):
+        await self.connect_all()
+        try:
+            await self.phase_join()
+            await self.phase_chat()
+            await self.phase_call()
+            await self.phase_signaling()
+        finally:
+            rss, peak = proc_memory_kb(self.server.proc.pid)
+            self.results['server'] = {'rss_kb': rss, 'peak_rss_kb': peak,
+                                      'cpu_seconds_total': proc_cpu_seconds(self.server.proc.pid)}
+            await asyncio.gather(*(c.sio.disconnect() for c in self.clients),
+                                 return_exceptions=True)
+        return self.results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--clients', type=int, default=200,
+                        help='simulated clients, paired up as chat/call partners (default 200)')
+    parser.add_argument('--messages', type=int, default=5, help='chat messages per client')
+    parser.add_argument('--signaling-pairs', type=int, default=20,
+                        help='pairs doing offer/answer/ICE (each relay is broadcast to all clients)')
+    parser.add_argument('--candidates', type=int, default=5, help='ICE candidates per offer')
+    parser.add_argument('--sdp-bytes', type=int, default=3000, help='size of the fake SDP')
+    parser.add_argument('--transport', choices=['websocket', 'polling'], default='websocket')
+    parser.add_argument('--serializer', choices=['default', 'msgpack'], default='default',
+                        help='Socket.IO serializer for both server and clients')
+    parser.add_argument('--rate-limits', default='off',
+                        help="server RATE_LIMITS setting: 'off' (default), 'default', or a JSON override")
+    parser.add_argument('--connect-concurrency', type=int, default=50)
+    parser.add_argument('--timeout', type=float, default=60.0, help='seconds to wait per phase')
+    parser.add_argument('--json-out', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare against a previous --json-out file')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed regression against the baseline (default 0.2 = 20%%)')
+    args = parser.parse_args(argv)
+    if args.clients < 2 or args.clients % 2:
+        parser.error('--clients must be an even number >= 2')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(f"🚀 Signaling benchmark: {args.clients} clients over {args.transport} ({args.serializer})")
+    rate_limits = '' if args.rate_limits == 'default' else args.rate_limits
+    with ServerProcess(env={'SOCKETIO_SERIALIZER': args.serializer, 'RATE_LIMITS': rate_limits}) as server:
+        results = asyncio.run(SignalingBench(args, server).run())
+
+    server_stats = results['server']
+    print(f"🖥️  Server: rss {server_stats['rss_kb'] / 1024:.1f}MB, "
+          f"peak {server_stats['peak_rss_kb'] / 1024:.1f}MB, "
+          f"cpu {server_stats['cpu_seconds_total']:.2f}s")
+
+    if args.json_out:
+        with open(args.json_out, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results written to {args.json_out}")
+
+    lost = sum(p['lost'] for p in results['phases'].values())
+    if lost:
+        print(f"⚠️  {lost} events were not delivered within {args.timeout}s")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline_config = json.load(f).get('config', {})
+        if any(baseline_config.get(k) != getattr(args, k) for k in ('clients', 'messages', 'transport', 'serializer')):
+            print("⚠️  Baseline was recorded with a different --clients/--messages/--transport/--serializer")
+        regressions = compare_with_baseline(results, args.baseline, args.tolerance)
+        if regressions:
+            print("❌ Regressions against baseline:")
+            for line in regressions:
+                print(f"   {line}")
+            return 1
+        print("✅ No regressions against baseline")
+    return 1 if lost else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""Cold boot time for N server workers sharing one database.
+
+Starts --workers Python processes at once, like gunicorn forking its workers,
+each importing source/server/app.py and calling create_app() against the same
+DATABASE_PATH. Reports per-worker import and create_app() times, the wall time
+until every worker is ready, how many workers actually ran the schema
+migrations, and whether importing the module alone touched the filesystem.
+
+Two rounds: 'fresh' starts from an empty directory (one worker migrates, the
+rest wait on its transaction), 'migrated' reboots on the existing database
+(every worker only reads PRAGMA user_version).
+
+Usage:
+  python benchmarks/bench_startup.py --workers 8
+  python benchmarks/bench_startup.py --workers 32 --json-out startup.json
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import PROJECT_ROOT, percentile
+
+WORKER_BOOT = r'''
+import json, os, sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+from source.server import app as chat_app
+imported = time.perf_counter()
+if len(sys.argv) > 2:  # import-only check
+    sys.exit(0)
+chat_app.create_app()
+ready = time.perf_counter()
+print(json.dumps({'import_s': imported - started, 'create_app_s': ready - imported}))
+'''
+
+
+def import_side_effects(env, workdir):
+    """Import the app once without create_app(); return (files created, lines printed)"""
+    before = set(os.listdir(workdir))
+    output = subprocess.run([sys.executable, '-c', WORKER_BOOT, PROJECT_ROOT, 'import-only'],
+                            env=env, capture_output=True, text=True, check=True).stdout
+    return sorted(set(os.listdir(workdir)) - before), output.strip().splitlines()
+
+
+def boot_workers(count, env):
+    """Start count workers at once and wait until all of them are ready"""
+    started = time.perf_counter()
+    procs = [subprocess.Popen([sys.executable, '-c', WORKER_BOOT, PROJECT_ROOT], env=env,
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+             for _ in range(count)]
+    outputs = [proc.communicate()[0] for proc in procs]
+    wall = time.perf_counter() - started
+
+    workers = []
+    migrations = 0
+    for proc, output in zip(procs, outputs):
+        lines = output.strip().splitlines()
+        if proc.returncode != 0 or not lines:
+            raise RuntimeError(f"worker failed ({proc.returncode}):\n{output}")
+        migrations += sum('schema migrated' in line for line in lines)
+        workers.append(json.loads(lines[-1]))
+
+    import_times = [w['import_s'] for w in workers]
+    create_times = [w['create_app_s'] for w in workers]
+    return {
+        'workers': count,
+        'wall_s': wall,
+        'import_p50_ms': percentile(import_times, 50) * 1000,
+        'import_max_ms': max(import_times) * 1000,
+        'create_app_p50_ms': percentile(create_times, 50) * 1000,
+        'create_app_max_ms': max(create_times) * 1000,
+        'migrations': migrations,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--json-out', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='chat_startup_bench_')
+    env = dict(os.environ,
+               DATABASE_PATH=os.path.join(workdir, 'data', 'messenger.db'),
+               DATABASE_BACKUP_PATH=os.path.join(workdir, 'backup', 'messenger.db'),
+               ARCHIVE_DIR=os.path.join(workdir, 'archive'),
+               PYTHONDONTWRITEBYTECODE='1')
+    results = {}
+    try:
+        created, printed = import_side_effects(env, workdir)
+        results['import'] = {'files_created': created, 'lines_printed': len(printed)}
+        for round_name in ('fresh', 'migrated'):
+            print(f"🚀 {round_name}: booting {args.workers} workers")
+            results[round_name] = boot_workers(args.workers, env)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n{'round':<10} {'wall':>8} {'import p50':>11} {'import max':>11} "
+          f"{'create p50':>11} {'create max':>11} {'migrated':>9}")
+    print("-" * 78)
+    for round_name in ('fresh', 'migrated'):
+        r = results[round_name]
+        print(f"{round_name:<10} {r['wall_s']:>7.2f}s {r['import_p50_ms']:>9.1f}ms "
+              f"{r['import_max_ms']:>9.1f}ms {r['create_app_p50_ms']:>9.1f}ms "
+              f"{r['create_app_max_ms']:>9.1f}ms {r['migrations']:>9}")
+    side_effects = results['import']
+    if side_effects['files_created'] or side_effects['lines_printed']:
+        print(f"\n⚠️  Importing app.py created {side_effects['files_created']} "
+              f"and printed {side_effects['lines_printed']} lines")
+    else:
+        print("\n✅ Importing app.py created no files and printed nothing")
+
+    if args.json_out:
+        with open(args.json_out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
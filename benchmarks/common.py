@@ -0,0 +1,158 @@
+"""Shared helpers for the offline benchmarks.
+
+Everything here runs on a single Linux box without network access: the server
+is started as a child process on 127.0.0.1 and its CPU/memory are sampled from
+/proc, so no extra monitoring packages are required.
+"""
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Boots source/server/app.py on 127.0.0.1; ServerProcess points DATABASE_PATH
+# at a throwaway database.
+SERVER_BOOT = '''
+import sys
+sys.path.insert(0, sys.argv[3])
+from source.server import app as chat_app
+chat_app.socketio.run(chat_app.create_app(), host='127.0.0.1', port=int(sys.argv[1]),
+                      debug=False, log_output=False, allow_unsafe_werkzeug=True)
+'''
+
+# Same, but in asyncio mode: AsyncServer + aiosqlite under uvicorn.
+ASGI_SERVER_BOOT = '''
+import sys
+sys.path.insert(0, sys.argv[3])
+import uvicorn
+from source.server.asgi_app import asgi_app
+uvicorn.run(asgi_app, host='127.0.0.1', port=int(sys.argv[1]), log_level='warning')
+'''
+
+CLK_TCK = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+def free_port():
+    """Ask the kernel for an unused TCP port"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_http(url, timeout=30.0):
+    """Poll url until it answers or timeout expires"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as resp:
+                resp.read()
+                return True
+        except Exception:
+            time.sleep(0.1)
+    return False
+
+
+class ServerProcess:
+    """Chat server running in a child process with a temporary database"""
+
+    def __init__(self, boot=SERVER_BOOT, port=None, env=None):
+        self.port = port or free_port()
+        self.tmpdir = tempfile.mkdtemp(prefix='chat_bench_')
+        self.db_path = os.path.join(self.tmpdir, 'bench.db')
+        self.boot = boot
+        # Load tests measure the server, not the per-connection budgets; pass
+        # env={'RATE_LIMITS': ...} to benchmark with limits enabled
+        self.env = dict(os.environ, DATABASE_PATH=self.db_path, RATE_LIMITS='off')
+        self.env.update(env or {})
+        self.proc = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.port}'
+
+    def start(self, timeout=30.0):
+        self.proc = subprocess.Popen(
+            [sys.executable, '-c', self.boot, str(self.port), self.db_path, PROJECT_ROOT],
+            cwd=PROJECT_ROOT, env=self.env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if not wait_for_http(self.url + '/working', timeout):
+            self.stop()
+            raise RuntimeError(f'Server did not come up on {self.url}')
+        return self
+
+    def stop(self):
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def proc_cpu_seconds(pid):
+    """User + system CPU seconds consumed by pid so far"""
+    with open(f'/proc/{pid}/stat') as f:
+        # The command name may contain spaces, so split after the closing ')'
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLK_TCK
+
+
+def proc_memory_kb(pid):
+    """Current and peak resident set size of pid in KiB"""
+    rss = peak = 0
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                rss = int(line.split()[1])
+            elif line.startswith('VmHWM:'):
+                peak = int(line.split()[1])
+    return rss, peak
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of values (0 when empty)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[k]
+
+
+def compare_with_baseline(results, baseline_path, tolerance):
+    """Return a list of regressions of results against a saved JSON baseline.
+
+    Throughput may not drop and p99 latency / CPU / memory may not grow by more
+    than tolerance (a fraction, e.g. 0.2 for 20%).
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    regressions = []
+    for phase, current in results.get('phases', {}).items():
+        old = baseline.get('phases', {}).get(phase)
+        if not old:
+            continue
+        if old.get('throughput') and current['throughput'] < old['throughput'] * (1 - tolerance):
+            regressions.append(f"{phase}: throughput {current['throughput']:.0f}/s < baseline {old['throughput']:.0f}/s")
+        for key in ('p99_ms', 'cpu_seconds'):
+            if old.get(key) and current[key] > old[key] * (1 + tolerance):
+                regressions.append(f"{phase}: {key} {current[key]:.2f} > baseline {old[key]:.2f}")
+    old_peak = baseline.get('server', {}).get('peak_rss_kb')
+    new_peak = results.get('server', {}).get('peak_rss_kb')
+    if old_peak and new_peak and new_peak > old_peak * (1 + tolerance):
+        regressions.append(f"server: peak RSS {new_peak} KiB > baseline {old_peak} KiB")
+    return regressions
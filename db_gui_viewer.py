@@ -1,13 +1,52 @@
-import sqlite3
+import os
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox
 
+from show_db import connect_readonly, iter_messages
+
+# Same database the server uses (see DATABASE_PATH in source/server/app.py)
+DB_PATH = os.environ.get('DATABASE_PATH',
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), 'messenger.db'))
+
 class DatabaseViewer:
+    # Messages loaded per page while scrolling down
+    PAGE_SIZE = 200
+    # A refresh that finds more new messages than this reloads from the newest page
+    MAX_INCREMENTAL = 2000
+    # Pages kept in the messages grid; rows scrolled far past are dropped and
+    # paged back in when the view scrolls back to them
+    MAX_PAGES = 10
+    
     def __init__(self):
         self.root = tk.Tk()
         self.root.title("💬 Chat Database Viewer")
         self.root.geometry("800x600")
         
+        # Paging state (message ids are shown newest first). The grid shows ids
+        # top_message_id..oldest_message_id; newest_message_id is the newest id
+        # seen in the database, which refresh_data() polls past.
+        self.newest_message_id = None
+        self.top_message_id = None
+        self.oldest_message_id = None
+        self.has_more_messages = True
+        self.has_newer_messages = False
+        self.loading_older = False
+        self.loading_newer = False
+        self.last_user_id = 0
+        self.loaded_users = 0
+        
+        # At most one refresh job of each kind is queued or running at a time
+        self.refreshing_users = False
+        self.refreshing_messages = False
+        
+        # Queries run on a worker thread; results come back through a queue that
+        # the Tk main loop polls, since Tk widgets may only be touched from it
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        threading.Thread(target=self.worker_loop, daemon=True).start()
+        
         # Create notebook for tabs
         notebook = ttk.Notebook(self.root)
         
@@ -15,7 +54,7 @@ class DatabaseViewer:
         users_frame = ttk.Frame(notebook)
         notebook.add(users_frame, text="👥 Users")
         
-        # Messages tab  
+        # Messages tab
         messages_frame = ttk.Frame(notebook)
         notebook.add(messages_frame, text="💬 Messages")
         
@@ -25,9 +64,14 @@ class DatabaseViewer:
         self.setup_messages_tab(messages_frame)
         
         # Refresh button
-        refresh_btn = tk.Button(self.root, text="🔄 Refresh", command=self.refresh_data)
-        refresh_btn.pack(pady=5)
+        bottom = tk.Frame(self.root)
+        bottom.pack(fill='x', pady=5)
+        refresh_btn = tk.Button(bottom, text="🔄 Refresh", command=self.refresh_data)
+        refresh_btn.pack()
+        self.status_var = tk.StringVar(value="Loading...")
+        tk.Label(bottom, textvariable=self.status_var, anchor='w').pack(fill='x', padx=10)
         
+        self.root.after(50, self.poll_results)
         self.refresh_data()
     
     def setup_users_tab(self, frame):
@@ -53,40 +97,230 @@ class DatabaseViewer:
         self.messages_tree.heading('Type', text='Type')
         self.messages_tree.heading('Time', text='Time')
         
-        messages_scroll = ttk.Scrollbar(frame, orient='vertical', command=self.messages_tree.yview)
-        self.messages_tree.configure(yscrollcommand=messages_scroll.set)
+        self.messages_scroll = ttk.Scrollbar(frame, orient='vertical', command=self.messages_tree.yview)
+        self.messages_tree.configure(yscrollcommand=self.on_messages_scroll)
         
         self.messages_tree.pack(side='left', fill='both', expand=True)
-        messages_scroll.pack(side='right', fill='y')
+        self.messages_scroll.pack(side='right', fill='y')
+    
+    def on_messages_scroll(self, first, last):
+        """Load the next older (or dropped newer) page when the view nears an edge"""
+        self.messages_scroll.set(first, last)
+        if float(last) > 0.9:
+            self.load_older_messages()
+        elif float(first) < 0.1:
+            self.load_newer_messages()
+    
+    def load_older_messages(self):
+        if self.loading_older or not self.has_more_messages or self.oldest_message_id is None:
+            return
+        self.loading_older = True
+        self.jobs.put(('older_messages', self.oldest_message_id))
+    
+    def load_newer_messages(self):
+        if self.loading_newer or not self.has_newer_messages:
+            return
+        self.loading_newer = True
+        self.jobs.put(('newer_messages', self.top_message_id))
     
     def refresh_data(self):
+        """Fetch only users and messages newer than the ones already shown"""
+        if not self.refreshing_users:
+            self.refreshing_users = True
+            self.jobs.put(('new_users', self.last_user_id))
+        # While the newest pages are dropped, scrolling up pages new messages in
+        if self.refreshing_messages or self.has_newer_messages:
+            return
+        self.refreshing_messages = True
+        if self.newest_message_id is None:
+            self.jobs.put(('latest_messages', None))
+        else:
+            self.jobs.put(('new_messages', self.newest_message_id))
+    
+    # --- worker thread ---------------------------------------------------
+    
+    def worker_loop(self):
+        conn = None
+        usernames = {}
+        while True:
+            job, arg = self.jobs.get()
+            try:
+                if conn is None:
+                    conn = connect_readonly(DB_PATH)
+                self.results.put((job, getattr(self, 'query_' + job)(conn, usernames, arg)))
+            except Exception as e:
+                if conn is not None:
+                    conn.close()
+                conn = None
+                self.results.put(('error', (job, str(e))))
+    
+    def query_new_users(self, conn, usernames, after_id):
+        rows = conn.execute("SELECT id, username, created_at FROM users WHERE id > ? ORDER BY id",
+                            (after_id,)).fetchall()
+        usernames.update((row[0], row[1]) for row in rows)
+        return rows
+    
+    def format_messages(self, rows, usernames):
+        formatted = []
+        for row in rows:
+            content = str(row[3])
+            content = content[:50] + "..." if len(content) > 50 else content
+            formatted.append((row[0], usernames.get(row[1], f'User {row[1]}'),
+                              usernames.get(row[2], f'User {row[2]}'), content, row[4], row[6]))
+        return formatted
+    
+    def query_latest_messages(self, conn, usernames, _):
+        return self.format_messages(iter_messages(conn, limit=self.PAGE_SIZE), usernames)
+    
+    def query_older_messages(self, conn, usernames, before_id):
+        rows = iter_messages(conn, limit=self.PAGE_SIZE, start_id=before_id)
+        return before_id, self.format_messages(rows, usernames)
+    
+    def query_newer_messages(self, conn, usernames, after_id):
+        rows = iter_messages(conn, newest_first=False, limit=self.PAGE_SIZE, start_id=after_id)
+        return after_id, self.format_messages(rows, usernames)
+    
+    def query_new_messages(self, conn, usernames, after_id):
+        rows = list(iter_messages(conn, newest_first=False, start_id=after_id,
+                                  limit=self.MAX_INCREMENTAL + 1))
+        if len(rows) > self.MAX_INCREMENTAL:
+            return None  # too far behind, start over from the newest page
+        return self.format_messages(rows, usernames)
+    
+    # --- Tk main loop ----------------------------------------------------
+    
+    def poll_results(self):
         try:
-            conn = sqlite3.connect('messenger.db')
-            cursor = conn.cursor()
-            
-            # Load users
-            self.users_tree.delete(*self.users_tree.get_children())
-            cursor.execute("SELECT id, username, created_at FROM users")
-            for row in cursor.fetchall():
-                self.users_tree.insert('', 'end', values=row)
-            
-            # Load messages
-            self.messages_tree.delete(*self.messages_tree.get_children())
-            cursor.execute("""
-                SELECT m.id, u1.username, u2.username, m.content, m.message_type, m.created_at
-                FROM messages m
-                JOIN users u1 ON m.sender_id = u1.id
-                JOIN users u2 ON m.receiver_id = u2.id
-                ORDER BY m.created_at DESC
-                LIMIT 50
-            """)
-            for row in cursor.fetchall():
-                content = row[3][:50] + "..." if len(row[3]) > 50 else row[3]
-                self.messages_tree.insert('', 'end', values=(row[0], row[1], row[2], content, row[4], row[5]))
-            
-            conn.close()
-        except Exception as e:
-            messagebox.showerror("Error", f"Database error: {e}")
+            while True:
+                job, payload = self.results.get_nowait()
+                getattr(self, 'show_' + job)(payload)
+        except queue.Empty:
+            pass
+        self.root.after(50, self.poll_results)
+    
+    def show_error(self, payload):
+        job, error = payload
+        if job == 'older_messages':
+            self.loading_older = False
+        elif job == 'newer_messages':
+            self.loading_newer = False
+        elif job == 'new_users':
+            self.refreshing_users = False
+        else:
+            self.refreshing_messages = False
+        messagebox.showerror("Error", f"Database error: {error}")
+    
+    def show_new_users(self, rows):
+        for row in rows:
+            self.users_tree.insert('', 'end', values=row)
+        if rows:
+            self.last_user_id = rows[-1][0]
+        self.loaded_users += len(rows)
+        self.refreshing_users = False
+        self.update_status()
+    
+    def show_latest_messages(self, rows):
+        # Row iids are message ids, so paging results can be matched to the grid
+        self.messages_tree.delete(*self.messages_tree.get_children())
+        for row in rows:
+            self.messages_tree.insert('', 'end', iid=row[0], values=row)
+        self.newest_message_id = rows[0][0] if rows else 0
+        self.top_message_id = rows[0][0] if rows else 0
+        self.oldest_message_id = rows[-1][0] if rows else None
+        self.has_more_messages = len(rows) == self.PAGE_SIZE
+        self.has_newer_messages = False
+        self.refreshing_messages = False
+        self.update_status()
+    
+    def show_older_messages(self, payload):
+        before_id, rows = payload
+        self.loading_older = False
+        # The grid was reset or trimmed since this page was requested
+        if before_id != self.oldest_message_id:
+            return
+        anchor = self.first_visible_message()
+        for row in rows:
+            self.messages_tree.insert('', 'end', iid=row[0], values=row)
+        if rows:
+            self.oldest_message_id = rows[-1][0]
+        self.has_more_messages = len(rows) == self.PAGE_SIZE
+        self.trim_messages(from_top=True)
+        self.scroll_to(anchor)
+        self.update_status()
+    
+    def show_newer_messages(self, payload):
+        after_id, rows = payload
+        self.loading_newer = False
+        if after_id != self.top_message_id:
+            return
+        anchor = self.first_visible_message()
+        # rows are oldest first; inserting each at the top keeps newest first
+        for row in rows:
+            self.messages_tree.insert('', 0, iid=row[0], values=row)
+        if rows:
+            self.top_message_id = rows[-1][0]
+        if len(rows) < self.PAGE_SIZE:
+            self.has_newer_messages = False
+            self.newest_message_id = self.top_message_id
+        self.trim_messages(from_top=False)
+        self.scroll_to(anchor)
+        self.update_status()
+    
+    def show_new_messages(self, rows):
+        if rows is None:
+            self.jobs.put(('latest_messages', None))
+            return
+        self.refreshing_messages = False
+        if self.has_newer_messages:
+            return  # the top pages were dropped meanwhile; scrolling up loads these
+        # Scrolling up may already have paged in some of these
+        rows = [row for row in rows if row[0] > self.top_message_id]
+        for row in rows:
+            self.messages_tree.insert('', 0, iid=row[0], values=row)
+        if rows:
+            self.newest_message_id = self.top_message_id = rows[-1][0]
+            if self.oldest_message_id is None:
+                self.oldest_message_id = rows[0][0]
+        self.trim_messages(from_top=False)
+        self.update_status()
+    
+    def trim_messages(self, from_top):
+        """Drop rows beyond MAX_PAGES pages from the end the view is farthest from"""
+        children = self.messages_tree.get_children()
+        excess = len(children) - self.MAX_PAGES * self.PAGE_SIZE
+        if excess <= 0:
+            return
+        if from_top:
+            self.messages_tree.delete(*children[:excess])
+            self.top_message_id = int(children[excess])
+            self.has_newer_messages = True
+        else:
+            self.messages_tree.delete(*children[-excess:])
+            self.oldest_message_id = int(children[-excess - 1])
+            self.has_more_messages = True
+    
+    def first_visible_message(self):
+        children = self.messages_tree.get_children()
+        if not children:
+            return None
+        index = int(float(self.messages_tree.yview()[0]) * len(children) + 0.5)
+        return children[min(index, len(children) - 1)]
+    
+    def scroll_to(self, item):
+        """Keep item at the top of the view after rows were added or dropped above it"""
+        if item is None or not self.messages_tree.exists(item):
+            return
+        self.messages_tree.yview_moveto(self.messages_tree.index(item) / len(self.messages_tree.get_children()))
+    
+    def update_status(self):
+        hints = []
+        if self.has_newer_messages:
+            hints.append("scroll up for newer")
+        if self.has_more_messages:
+            hints.append("scroll for more")
+        more = f" ({', '.join(hints)})" if hints else ""
+        shown = len(self.messages_tree.get_children())
+        self.status_var.set(f"{self.loaded_users} users, {shown} messages shown{more}")
     
     def run(self):
         self.root.mainloop()
@@ -1,10 +1,15 @@
 import sqlite3
 import os
 from datetime import datetime
+from show_db import connect_readonly, approximate_count, iter_messages, export_messages, resolve_user
+
+# Same database the server uses (see DATABASE_PATH in source/server/app.py)
+DB_PATH = os.environ.get('DATABASE_PATH',
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), 'messenger.db'))
 
 def view_database():
     """View all data in messenger.db"""
-    db_path = 'messenger.db'
+    db_path = DB_PATH
     
     print(f"🔍 Looking for database at: {os.path.abspath(db_path)}")
     print(f"📁 Current working directory: {os.getcwd()}")
@@ -20,7 +25,8 @@ def view_database():
     print(f"✅ Database file found! Size: {os.path.getsize(db_path)} bytes")
     
     try:
-        conn = sqlite3.connect(db_path)
+        # Read-only: never takes a write lock on the server's database
+        conn = connect_readonly(db_path)
         cursor = conn.cursor()
         
         print("\n" + "="*60)
@@ -56,13 +62,12 @@ def view_database():
                 columns = [col[1] for col in columns_info]
                 print(f"Columns: {columns}")
                 
-                cursor.execute("SELECT COUNT(*) FROM users")
-                count = cursor.fetchone()[0]
-                print(f"Total users: {count}")
+                count = approximate_count(cursor, 'users')
+                print(f"Total users: ~{count}")
                 
-                if count > 0:
-                    cursor.execute("SELECT * FROM users LIMIT 10")
-                    users = cursor.fetchall()
+                cursor.execute("SELECT * FROM users ORDER BY id LIMIT 10")
+                users = cursor.fetchall()
+                if users:
                     print("\nUsers data:")
                     
                     for i, user in enumerate(users, 1):
@@ -89,19 +94,11 @@ def view_database():
             print("💬 MESSAGES TABLE:")
             print("-" * 30)
             try:
-                cursor.execute("SELECT COUNT(*) FROM messages")
-                count = cursor.fetchone()[0]
-                print(f"Total messages: {count}")
+                count = approximate_count(cursor, 'messages')
+                print(f"Total messages: ~{count}")
                 
-                if count > 0:
-                    cursor.execute("""
-                        SELECT m.id, m.sender_id, m.receiver_id, m.content, 
-                               m.message_type, m.file_path, m.created_at
-                        FROM messages m
-                        ORDER BY m.created_at DESC
-                        LIMIT 5
-                    """)
-                    messages = cursor.fetchall()
+                messages = list(iter_messages(conn, limit=5))
+                if messages:
                     print("\nRecent messages:")
                     
                     for i, msg in enumerate(messages, 1):
@@ -135,7 +132,7 @@ def create_test_database():
     print("🔧 Creating test database...")
     
     try:
-        conn = sqlite3.connect('messenger.db')
+        conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
         
         print("📋 Creating tables...")
@@ -226,7 +223,7 @@ def create_test_database():
 
 def clear_database():
     """Clear all data from database"""
-    db_path = 'messenger.db'
+    db_path = DB_PATH
     
     if not os.path.exists(db_path):
         print("❌ Database file not found!")
@@ -258,7 +255,7 @@ def clear_database():
 
 def check_database_file():
     """Check database file info"""
-    db_path = 'messenger.db'
+    db_path = DB_PATH
     abs_path = os.path.abspath(db_path)
     
     print("🔍 DATABASE FILE CHECK:")
@@ -271,7 +268,7 @@ def check_database_file():
         print(f"Size: {size:,} bytes")
         
         try:
-            conn = sqlite3.connect(db_path)
+            conn = connect_readonly(db_path)
             cursor = conn.cursor()
             cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
             tables = cursor.fetchall()
@@ -285,6 +282,44 @@ def check_database_file():
     
     input("\nPress Enter to continue...")
 
+def export_database():
+    """Stream messages to CSV or JSON lines without loading them into memory"""
+    db_path = DB_PATH
+    
+    if not os.path.exists(db_path):
+        print("❌ Database file not found!")
+        input("Press Enter to continue...")
+        return
+    
+    print("📤 EXPORT MESSAGES")
+    print("-" * 40)
+    fmt = input("Format (csv/jsonl) [csv]: ").strip() or 'csv'
+    if fmt not in ('csv', 'jsonl'):
+        print("❌ Unknown format!")
+        input("Press Enter to continue...")
+        return
+    output_path = input(f"Output file [messages.{fmt}]: ").strip() or f'messages.{fmt}'
+    user = input("User (id or username, empty = everyone): ").strip() or None
+    peer = input("Conversation with (id or username, empty = everyone): ").strip() or None
+    since = input("Since (YYYY-MM-DD, empty = no limit): ").strip() or None
+    until = input("Until (YYYY-MM-DD, empty = no limit): ").strip() or None
+    
+    try:
+        conn = connect_readonly(db_path)
+        user_id = resolve_user(conn, user)
+        peer_id = resolve_user(conn, peer) if user_id is not None else None
+        conn.close()
+        
+        started = datetime.now()
+        count = export_messages(output_path, fmt, db_path, user_id=user_id, peer_id=peer_id,
+                                since=since, until=until)
+        elapsed = (datetime.now() - started).total_seconds()
+        print(f"✅ Exported {count} messages to {output_path} in {elapsed:.1f}s")
+    except Exception as e:
+        print(f"❌ Export error: {e}")
+    
+    input("\nPress Enter to continue...")
+
 def main_menu():
     """Main menu for database operations"""
     while True:
@@ -297,10 +332,11 @@ def main_menu():
         print("2. 🗑️  Clear Database") 
         print("3. 🔧 Create Test Database")
         print("4. 🔍 Check Database File")
-        print("5. 🚪 Exit")
+        print("5. 📤 Export Messages")
+        print("6. 🚪 Exit")
         print("="*40)
         
-        choice = input("Select option (1-5): ").strip()
+        choice = input("Select option (1-6): ").strip()
         
         if choice == '1':
             view_database()
@@ -311,10 +347,12 @@ def main_menu():
         elif choice == '4':
             check_database_file()
         elif choice == '5':
+            export_database()
+        elif choice == '6':
             print("👋 Goodbye!")
             break
         else:
-            print("❌ Invalid choice! Please enter 1-5")
+            print("❌ Invalid choice! Please enter 1-6")
             input("Press Enter to try again...")
 
 if __name__ == "__main__":
@@ -1,63 +1,176 @@
 import sqlite3
 import os
+import sys
+import csv
+import json
+import argparse
+from urllib.request import pathname2url
 
-def show_tables(limit_messages=10):
+# Same database the server uses (see DATABASE_PATH in source/server/app.py)
+DB_PATH = os.environ.get('DATABASE_PATH',
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), 'messenger.db'))
+
+# Rows fetched per keyset page; memory use stays constant whatever the table size
+PAGE_SIZE = 1000
+
+def connect_readonly(db_path=None):
+    """Open the database read-only so the viewer never blocks or modifies the server's writes"""
+    db_path = os.path.abspath(db_path or DB_PATH)
+    return sqlite3.connect(f'file:{pathname2url(db_path)}?mode=ro', uri=True)
+
+def approximate_count(cursor, table):
+    """Row count upper bound from sqlite_sequence, without a COUNT(*) table scan"""
+    try:
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+    except sqlite3.OperationalError:
+        return 0
+
+def load_usernames(conn):
+    """id -> username map, used instead of joining users for every message row"""
+    return dict(conn.execute("SELECT id, username FROM users"))
+
+def resolve_user(conn, value):
+    """Accept a user id or a username"""
+    if value is None:
+        return None
+    if str(value).isdigit():
+        return int(value)
+    row = conn.execute("SELECT id FROM users WHERE username = ?", (value,)).fetchone()
+    if not row:
+        raise ValueError(f"Unknown user: {value}")
+    return row[0]
+
+def iter_messages(conn, user_id=None, peer_id=None, since=None, until=None,
+                  limit=None, newest_first=True, page_size=PAGE_SIZE, start_id=None):
+    """Yield message rows page by page using keyset paging on id.
+    
+    Each page is a fresh indexed range query (id < last seen id), so no OFFSET
+    scans and no result set is ever held in memory. Filters: user_id (sent or
+    received), peer_id (conversation with user_id), since/until on created_at.
+    start_id resumes after (exclusive) a previously seen id.
+    """
+    conditions = []
+    params = []
+    if user_id is not None and peer_id is not None:
+        conditions.append("((sender_id = ? AND receiver_id = ?) OR (sender_id = ? AND receiver_id = ?))")
+        params += [user_id, peer_id, peer_id, user_id]
+    elif user_id is not None:
+        conditions.append("(sender_id = ? OR receiver_id = ?)")
+        params += [user_id, user_id]
+    if since:
+        conditions.append("created_at >= ?")
+        params.append(since)
+    if until:
+        conditions.append("created_at < ?")
+        params.append(until)
+    
+    order = "DESC" if newest_first else "ASC"
+    keyset = "id < ?" if newest_first else "id > ?"
+    if start_id is not None:
+        last_id = start_id
+    else:
+        last_id = sys.maxsize if newest_first else 0
+    remaining = limit
+    
+    while remaining is None or remaining > 0:
+        size = page_size if remaining is None else min(page_size, remaining)
+        where = " AND ".join(conditions + [keyset])
+        cursor = conn.execute(f"""
+            SELECT id, sender_id, receiver_id, content, message_type, file_path, created_at
+            FROM messages
+            WHERE {where}
+            ORDER BY id {order}
+            LIMIT ?
+        """, params + [last_id, size])
+        
+        count = 0
+        for row in cursor:
+            count += 1
+            last_id = row[0]
+            yield row
+        if count < size:
+            return
+        if remaining is not None:
+            remaining -= count
+
+def export_messages(output_path, fmt='csv', db_path=None, **filters):
+    """Stream matching messages to CSV or JSON lines. Returns the number of rows written."""
+    conn = connect_readonly(db_path)
+    try:
+        usernames = load_usernames(conn)
+        written = 0
+        with open(output_path, 'w', newline='', encoding='utf-8') as f:
+            if fmt == 'csv':
+                writer = csv.writer(f)
+                writer.writerow(['id', 'sender_id', 'sender', 'receiver_id', 'receiver',
+                                 'content', 'message_type', 'file_path', 'created_at'])
+            for msg in iter_messages(conn, newest_first=False, **filters):
+                sender = usernames.get(msg[1], f'User {msg[1]}')
+                receiver = usernames.get(msg[2], f'User {msg[2]}')
+                if fmt == 'csv':
+                    writer.writerow([msg[0], msg[1], sender, msg[2], receiver,
+                                     msg[3], msg[4], msg[5], msg[6]])
+                else:
+                    f.write(json.dumps({
+                        'id': msg[0], 'sender_id': msg[1], 'sender': sender,
+                        'receiver_id': msg[2], 'receiver': receiver, 'content': msg[3],
+                        'message_type': msg[4], 'file_path': msg[5], 'created_at': msg[6]
+                    }, ensure_ascii=False) + '\n')
+                written += 1
+        return written
+    finally:
+        conn.close()
+
+def show_tables(limit_messages=10, **filters):
     """Display database tables in a nice format"""
-    if not os.path.exists('messenger.db'):
+    if not os.path.exists(DB_PATH):
         print("❌ Database not found! Run the server first.")
         return
     
-    conn = sqlite3.connect('messenger.db')
+    conn = connect_readonly()
     cursor = conn.cursor()
     
     print("📊 USERS TABLE")
     print("-" * 60)
-    cursor.execute("SELECT COUNT(*) FROM users")
-    user_count = cursor.fetchone()[0]
-    print(f"Total users: {user_count}")
+    user_count = approximate_count(cursor, 'users')
+    print(f"Total users: ~{user_count}")
     
+    usernames = {}
     cursor.execute("SELECT id, username, created_at FROM users")
-    users = cursor.fetchall()
-    
-    if users:
-        print(f"\n{'ID':<5} {'Username':<20} {'Created At':<25}")
-        print("-" * 60)
-        for user in users:
-            print(f"{user[0]:<5} {user[1]:<20} {str(user[2]):<25}")
-    else:
+    printed_header = False
+    for user in cursor:
+        if not printed_header:
+            print(f"\n{'ID':<5} {'Username':<20} {'Created At':<25}")
+            print("-" * 60)
+            printed_header = True
+        usernames[user[0]] = user[1]
+        print(f"{user[0]:<5} {user[1]:<20} {str(user[2]):<25}")
+    if not printed_header:
         print("No users found")
     
     print("\n💬 MESSAGES TABLE")
     print("-" * 80)
-    cursor.execute("SELECT COUNT(*) FROM messages")
-    msg_count = cursor.fetchone()[0]
-    print(f"Total messages: {msg_count}")
+    msg_count = approximate_count(cursor, 'messages')
+    print(f"Total messages: ~{msg_count}")
     
     if limit_messages == 0:
         print("Showing ALL messages:")
-        limit_clause = ""
     else:
         print(f"Showing {limit_messages} most recent messages:")
-        limit_clause = f"LIMIT {limit_messages}"
-    
-    cursor.execute(f"""
-        SELECT m.id, u1.username as sender, u2.username as receiver, 
-               m.content, m.message_type, m.created_at
-        FROM messages m
-        JOIN users u1 ON m.sender_id = u1.id
-        JOIN users u2 ON m.receiver_id = u2.id
-        ORDER BY m.created_at DESC
-        {limit_clause}
-    """)
-    messages = cursor.fetchall()
-    
-    if messages:
-        print(f"\n{'ID':<5} {'From':<15} {'To':<15} {'Content':<30} {'Type':<10} {'Time':<20}")
-        print("-" * 80)
-        for msg in messages:
-            content = msg[3][:30] + "..." if len(str(msg[3])) > 30 else str(msg[3])
-            print(f"{msg[0]:<5} {msg[1]:<15} {msg[2]:<15} {content:<30} {msg[4]:<10} {str(msg[5]):<20}")
-    else:
+    
+    printed_header = False
+    for msg in iter_messages(conn, limit=limit_messages or None, **filters):
+        if not printed_header:
+            print(f"\n{'ID':<5} {'From':<15} {'To':<15} {'Content':<30} {'Type':<10} {'Time':<20}")
+            print("-" * 80)
+            printed_header = True
+        sender = usernames.get(msg[1], f'User {msg[1]}')
+        receiver = usernames.get(msg[2], f'User {msg[2]}')
+        content = msg[3][:30] + "..." if len(str(msg[3])) > 30 else str(msg[3])
+        print(f"{msg[0]:<5} {sender:<15} {receiver:<15} {content:<30} {msg[4]:<10} {str(msg[6]):<20}")
+    if not printed_header:
         print("No messages found")
     
     conn.close()
@@ -78,9 +191,10 @@ def interactive_menu():
         print("1. Show recent (10 messages)")
         print("2. Show ALL messages")
         print("3. Show only users")
-        print("4. Exit")
+        print("4. Export messages (CSV / JSON lines)")
+        print("5. Exit")
         
-        choice = input("\nSelect option (1-4): ").strip()
+        choice = input("\nSelect option (1-5): ").strip()
         
         if choice == '1':
             show_recent_tables()
@@ -89,6 +203,8 @@ def interactive_menu():
         elif choice == '3':
             show_users_only()
         elif choice == '4':
+            export_menu()
+        elif choice == '5':
             print("👋 Goodbye!")
             break
         else:
@@ -96,48 +212,92 @@ def interactive_menu():
         
         input("\nPress Enter to continue...")
 
+def export_menu():
+    """Ask for export options and stream the messages to a file"""
+    if not os.path.exists(DB_PATH):
+        print("❌ Database not found!")
+        return
+    
+    fmt = input("Format (csv/jsonl) [csv]: ").strip() or 'csv'
+    if fmt not in ('csv', 'jsonl'):
+        print("❌ Unknown format!")
+        return
+    output_path = input(f"Output file [messages.{fmt}]: ").strip() or f'messages.{fmt}'
+    user = input("Only messages of user (id or username, empty = all): ").strip() or None
+    since = input("Since date (YYYY-MM-DD, empty = no limit): ").strip() or None
+    
+    try:
+        conn = connect_readonly()
+        user_id = resolve_user(conn, user)
+        conn.close()
+        count = export_messages(output_path, fmt, user_id=user_id, since=since)
+        print(f"✅ Exported {count} messages to {output_path}")
+    except Exception as e:
+        print(f"❌ Export error: {e}")
+
 def show_users_only():
     """Show only users table"""
-    if not os.path.exists('messenger.db'):
+    if not os.path.exists(DB_PATH):
         print("❌ Database not found!")
         return
     
-    conn = sqlite3.connect('messenger.db')
+    conn = connect_readonly()
     cursor = conn.cursor()
     
     print("👥 USERS TABLE (COMPLETE)")
     print("-" * 60)
-    cursor.execute("SELECT COUNT(*) FROM users")
-    user_count = cursor.fetchone()[0]
-    print(f"Total users: {user_count}")
+    user_count = approximate_count(cursor, 'users')
+    print(f"Total users: ~{user_count}")
     
     cursor.execute("SELECT id, username, created_at FROM users ORDER BY id")
-    users = cursor.fetchall()
-    
-    if users:
-        print(f"\n{'ID':<5} {'Username':<20} {'Created At':<25}")
-        print("-" * 60)
-        for user in users:
-            print(f"{user[0]:<5} {user[1]:<20} {str(user[2]):<25}")
-    else:
+    printed_header = False
+    for user in cursor:
+        if not printed_header:
+            print(f"\n{'ID':<5} {'Username':<20} {'Created At':<25}")
+            print("-" * 60)
+            printed_header = True
+        print(f"{user[0]:<5} {user[1]:<20} {str(user[2]):<25}")
+    if not printed_header:
         print("No users found")
     
     conn.close()
 
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="View or export the chat database")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--all', action='store_true', help='show ALL messages')
+    mode.add_argument('--users', action='store_true', help='show only users')
+    mode.add_argument('--menu', action='store_true', help='interactive menu')
+    mode.add_argument('--export', metavar='FILE', help='stream matching messages to FILE')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv', help='export format')
+    parser.add_argument('--limit', type=int, default=10, help='messages to show (default 10)')
+    parser.add_argument('--user', help='only messages sent or received by this user (id or username)')
+    parser.add_argument('--peer', help='with --user: only the conversation with this user')
+    parser.add_argument('--since', help='only messages created at or after this date (YYYY-MM-DD)')
+    parser.add_argument('--until', help='only messages created before this date (YYYY-MM-DD)')
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
-    # Default behavior - show recent
-    if len(os.sys.argv) > 1:
-        if os.sys.argv[1] == "--all":
-            show_all_tables()
-        elif os.sys.argv[1] == "--users":
-            show_users_only()
-        elif os.sys.argv[1] == "--menu":
-            interactive_menu()
-        else:
-            print("Usage:")
-            print("  python show_db.py           # Show recent messages")
-            print("  python show_db.py --all     # Show ALL messages")
-            print("  python show_db.py --users   # Show only users")
-            print("  python show_db.py --menu    # Interactive menu")
-    else:
+    if len(sys.argv) == 1:
+        interactive_menu()
+        sys.exit(0)
+    
+    args = parse_args(sys.argv[1:])
+    if args.users:
+        show_users_only()
+    elif args.menu:
         interactive_menu()
+    else:
+        if not os.path.exists(DB_PATH):
+            print("❌ Database not found! Run the server first.")
+            sys.exit(1)
+        conn = connect_readonly()
+        filters = {'user_id': resolve_user(conn, args.user), 'peer_id': resolve_user(conn, args.peer),
+                   'since': args.since, 'until': args.until}
+        conn.close()
+        
+        if args.export:
+            count = export_messages(args.export, args.format, **filters)
+            print(f"✅ Exported {count} messages to {args.export}")
+        else:
+            show_tables(limit_messages=0 if args.all else args.limit, **filters)
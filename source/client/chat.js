@@ -0,0 +1,608 @@
+// Global variables
+let socket;
+let currentUser = null;
+let selectedUserId = null;
+let unreadCounts = {};
+let messageQueue = [];
+let connectionRetries = 0;
+const maxRetries = 5;
+let isConnected = false;
+let lastMessageId = 0;
+let typingTimer;
+let isTyping = false;
+
+// History paging (older pages may come from the server's archives)
+const HISTORY_PAGE_SIZE = 50;
+let oldestMessageId = null;
+let hasMoreHistory = false;
+let loadingHistory = false;
+
+// Message status tracking
+let pendingMessages = new Map(); // client_message_id -> message data
+let messageRetryCount = new Map(); // client_message_id -> retry count
+
+// Initialize
+document.addEventListener('DOMContentLoaded', function() {
+    const userData = localStorage.getItem('userData');
+    if (!userData) {
+        window.location.href = '/';
+        return;
+    }
+
+    currentUser = JSON.parse(userData);
+    document.getElementById('currentUser').textContent = currentUser.username;
+
+    initializeSocket();
+    loadUsers();
+
+    // Setup message input
+    const messageInput = document.getElementById('messageInput');
+    messageInput.addEventListener('keypress', function(e) {
+        if (e.key === 'Enter' && !e.shiftKey) {
+            e.preventDefault();
+            sendMessage();
+        }
+
+        // Typing indicator
+        handleTyping();
+    });
+
+    // File upload
+    document.getElementById('fileInput').addEventListener('change', handleFileUpload);
+
+    // Load older messages when scrolled to the top
+    document.getElementById('messagesContainer').addEventListener('scroll', function() {
+        if (this.scrollTop < 50) {
+            loadOlderMessages();
+        }
+    });
+
+    // Auto-reconnect on visibility change
+    document.addEventListener('visibilitychange', function() {
+        if (!document.hidden && !isConnected) {
+            attemptReconnection();
+        }
+    });
+
+    // Heartbeat
+    setInterval(sendHeartbeat, 30000);
+});
+
+function initializeSocket() {
+    updateConnectionStatus('reconnecting', 'Connecting...');
+
+    socket = io({
+        transports: ['websocket', 'polling'],
+        upgrade: true,
+        rememberUpgrade: true,
+        timeout: 20000,
+        forceNew: true
+    });
+
+    // Connection events
+    socket.on('connect', function() {
+        console.log('Connected to server');
+        isConnected = true;
+        connectionRetries = 0;
+        updateConnectionStatus('online', 'Connected');
+
+        // Join room
+        socket.emit('join', { user_id: currentUser.user_id });
+
+        // Recover connection
+        socket.emit('recover_connection', {
+            user_id: currentUser.user_id,
+            last_message_id: lastMessageId
+        });
+
+        // Process queued messages
+        processMessageQueue();
+
+        showNotification('Connected successfully!', 'success');
+    });
+
+    socket.on('disconnect', function() {
+        console.log('Disconnected from server');
+        isConnected = false;
+        updateConnectionStatus('disconnected', 'Disconnected');
+        showNotification('Connection lost. Attempting to reconnect...', 'warning');
+        attemptReconnection();
+    });
+
+    socket.on('connect_error', function(error) {
+        console.log('Connection error:', error);
+        isConnected = false;
+        updateConnectionStatus('disconnected', 'Connection failed');
+        attemptReconnection();
+    });
+
+    // Message events
+    socket.on('new_message', function(data) {
+        addMessage(data);
+        lastMessageId = Math.max(lastMessageId, data.id);
+
+        // Update unread count
+        if (data.sender_id !== currentUser.user_id && data.sender_id !== selectedUserId) {
+            unreadCounts[data.sender_id] = (unreadCounts[data.sender_id] || 0) + 1;
+            updateUsersList();
+        }
+
+        // Auto-scroll
+        scrollToBottom();
+
+        // Mark as read if chat is open
+        if (data.sender_id === selectedUserId) {
+            markMessageAsRead(data.id);
+        }
+    });
+
+    socket.on('message_received', function(data) {
+        updateMessageStatus(data.client_message_id, 'sent');
+    });
+
+    socket.on('message_delivered', function(data) {
+        updateMessageStatus(data.client_message_id, 'delivered');
+        pendingMessages.delete(data.client_message_id);
+    });
+
+    socket.on('message_read_status', function(data) {
+        updateMessageStatus(data.message_id, 'read');
+    });
+
+    socket.on('missed_messages', function(data) {
+        data.messages.forEach(addMessage);
+        scrollToBottom();
+    });
+
+    socket.on('user_status_changed', function(data) {
+        updateUserStatus(data);
+    });
+
+    socket.on('error', function(data) {
+        console.error('Socket error:', data);
+        showNotification('Error: ' + data.message, 'error');
+
+        if (data.client_message_id) {
+            updateMessageStatus(data.client_message_id, 'failed');
+        }
+    });
+
+    // Heartbeat
+    socket.on('pong', function() {
+        console.log('Heartbeat received');
+    });
+}
+
+function updateConnectionStatus(status, text) {
+    const statusEl = document.getElementById('connectionStatus');
+    const textEl = document.getElementById('connectionText');
+
+    statusEl.className = `connection-status ${status}`;
+    textEl.textContent = text;
+}
+
+function attemptReconnection() {
+    if (connectionRetries >= maxRetries) {
+        updateConnectionStatus('disconnected', 'Connection failed');
+        showNotification('Failed to connect. Please refresh the page.', 'error');
+        return;
+    }
+
+    connectionRetries++;
+    updateConnectionStatus('reconnecting', `Reconnecting... (${connectionRetries}/${maxRetries})`);
+
+    setTimeout(() => {
+        if (!isConnected) {
+            socket.connect();
+        }
+    }, 2000 * connectionRetries);
+}
+
+function sendHeartbeat() {
+    if (socket && isConnected) {
+        socket.emit('ping');
+    }
+}
+
+function processMessageQueue() {
+    messageQueue.forEach(message => {
+        socket.emit('send_message', message);
+    });
+    messageQueue = [];
+}
+
+function generateMessageId() {
+    return Date.now().toString(36) + Math.random().toString(36).substr(2);
+}
+
+function sendMessage() {
+    const input = document.getElementById('messageInput');
+    const content = input.value.trim();
+
+    if (!content || !selectedUserId) return;
+
+    const clientMessageId = generateMessageId();
+    const messageData = {
+        sender_id: currentUser.user_id,
+        receiver_id: selectedUserId,
+        content: content,
+        message_type: 'text',
+        client_message_id: clientMessageId
+    };
+
+    // Add to UI immediately with pending status
+    const tempMessage = {
+        ...messageData,
+        id: clientMessageId,
+        sender_name: currentUser.username,
+        created_at: new Date().toISOString()
+    };
+    addMessage(tempMessage, 'sending');
+
+    // Store pending message
+    pendingMessages.set(clientMessageId, messageData);
+    messageRetryCount.set(clientMessageId, 0);
+
+    // Send message
+    if (isConnected) {
+        socket.emit('send_message', messageData);
+    } else {
+        messageQueue.push(messageData);
+        updateMessageStatus(clientMessageId, 'failed');
+    }
+
+    input.value = '';
+}
+
+function retryMessage(clientMessageId) {
+    const messageData = pendingMessages.get(clientMessageId);
+    if (!messageData) return;
+
+    const retryCount = messageRetryCount.get(clientMessageId) || 0;
+    if (retryCount >= 3) {
+        showNotification('Message failed after 3 retries', 'error');
+        return;
+    }
+
+    messageRetryCount.set(clientMessageId, retryCount + 1);
+    updateMessageStatus(clientMessageId, 'sending');
+
+    if (isConnected) {
+        socket.emit('send_message', messageData);
+    } else {
+        updateMessageStatus(clientMessageId, 'failed');
+    }
+}
+
+function updateMessageStatus(identifier, status) {
+    const messageEl = document.querySelector(`[data-message-id="${identifier}"], [data-client-id="${identifier}"]`);
+    if (!messageEl) return;
+
+    const statusEl = messageEl.querySelector('.message-status');
+    if (!statusEl) return;
+
+    statusEl.className = `message-status ${status}`;
+
+    switch(status) {
+        case 'sending':
+            statusEl.innerHTML = '⏳ Sending...';
+            break;
+        case 'sent':
+            statusEl.innerHTML = '✓ Sent';
+            break;
+        case 'delivered':
+            statusEl.innerHTML = '✓✓ Delivered';
+            break;
+        case 'read':
+            statusEl.innerHTML = '✓✓ Read';
+            break;
+        case 'failed':
+            const retryBtn = `<button class="retry-btn" onclick="retryMessage('${identifier}')">Retry</button>`;
+            statusEl.innerHTML = `❌ Failed ${retryBtn}`;
+            break;
+    }
+}
+
+function addMessage(data, initialStatus = null) {
+    const container = document.getElementById('messagesContainer');
+    const isOwn = data.sender_id === currentUser.user_id;
+
+    const messageDiv = document.createElement('div');
+    messageDiv.className = `message ${isOwn ? 'own' : ''}`;
+    messageDiv.setAttribute('data-message-id', data.id);
+    if (data.client_message_id) {
+        messageDiv.setAttribute('data-client-id', data.client_message_id);
+    }
+
+    let statusHtml = '';
+    if (isOwn && initialStatus) {
+        const statusText = {
+            'sending': '⏳ Sending...',
+            'sent': '✓ Sent',
+            'delivered': '✓✓ Delivered',
+            'read': '✓✓ Read',
+            'failed': '❌ Failed'
+        }[initialStatus];
+        statusHtml = `<div class="message-status ${initialStatus}">${statusText}</div>`;
+    }
+
+    let contentHtml = '';
+    if (data.message_type === 'file' && data.file_path) {
+        const fileUrl = `/uploads/${data.file_path}`;
+        const fileName = data.file_path.split('_').slice(1).join('_');
+
+        if (data.file_path.match(/\.(jpg|jpeg|png|gif|webp)$/i)) {
+            contentHtml = `<img src="${fileUrl}" alt="${fileName}" style="max-width: 200px; border-radius: 8px;">`;
+        } else {
+            contentHtml = `<a href="${fileUrl}" download="${fileName}" style="color: inherit;">${fileName}</a>`;
+        }
+    } else {
+        contentHtml = escapeHtml(data.content);
+    }
+
+    messageDiv.innerHTML = `
+        <div class="message-content">
+            ${!isOwn ? `<div style="font-size: 12px; margin-bottom: 5px; opacity: 0.7;">${data.sender_name}</div>` : ''}
+            <div>${contentHtml}</div>
+            <div style="font-size: 10px; margin-top: 5px; opacity: 0.7;">
+                ${new Date(data.created_at).toLocaleTimeString()}
+            </div>
+            ${statusHtml}
+        </div>
+    `;
+
+    container.appendChild(messageDiv);
+}
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
+function markMessageAsRead(messageId) {
+    if (socket && isConnected) {
+        socket.emit('message_read', {
+            message_id: messageId,
+            user_id: currentUser.user_id
+        });
+    }
+}
+
+function scrollToBottom() {
+    const container = document.getElementById('messagesContainer');
+    container.scrollTop = container.scrollHeight;
+}
+
+function loadUsers() {
+    fetch('/api/users')
+        .then(response => response.json())
+        .then(users => {
+            updateUsersList(users);
+        })
+        .catch(error => {
+            console.error('Error loading users:', error);
+            showNotification('Failed to load users', 'error');
+        });
+}
+
+function updateUsersList(users = null) {
+    if (!users) return;
+
+    const container = document.getElementById('usersList');
+    container.innerHTML = '';
+
+    users.forEach(user => {
+        if (user.id === currentUser.user_id) return;
+
+        const unreadCount = unreadCounts[user.id] || 0;
+        const userDiv = document.createElement('div');
+        userDiv.className = `user-item ${selectedUserId === user.id ? 'active' : ''}`;
+        userDiv.onclick = () => selectUser(user.id, user.username);
+
+        userDiv.innerHTML = `
+            <div class="user-status">
+                <div class="status-dot ${user.status}"></div>
+                <div>
+                    <div style="font-weight: bold;">${user.username}</div>
+                    <div style="font-size: 12px; opacity: 0.7;">
+                        ${user.status === 'online' ? 'Online' : 'Last seen: ' + new Date(user.last_seen).toLocaleString()}
+                    </div>
+                </div>
+            </div>
+            ${unreadCount > 0 ? `<div class="unread-count">${unreadCount}</div>` : ''}
+        `;
+
+        container.appendChild(userDiv);
+    });
+}
+
+function selectUser(userId, username) {
+    selectedUserId = userId;
+    unreadCounts[userId] = 0;
+
+    document.getElementById('currentChatUser').textContent = username;
+    document.getElementById('videoCallBtn').disabled = false;
+
+    // Update UI
+    document.querySelectorAll('.user-item').forEach(item => item.classList.remove('active'));
+    event.currentTarget.classList.add('active');
+
+    // Load messages
+    loadMessages(currentUser.user_id, userId);
+
+    updateUsersList();
+}
+
+function loadMessages(user1Id, user2Id) {
+    const container = document.getElementById('messagesContainer');
+    container.innerHTML = '';
+
+    oldestMessageId = null;
+    hasMoreHistory = false;
+
+    fetch(`/api/messages/${user1Id}/${user2Id}?limit=${HISTORY_PAGE_SIZE}`)
+        .then(response => response.json())
+        .then(messages => {
+            messages.forEach(addMessage);
+            scrollToBottom();
+
+            // Update last message ID
+            if (messages.length > 0) {
+                lastMessageId = Math.max(lastMessageId, ...messages.map(m => m.id));
+                oldestMessageId = messages[0].id;
+            }
+            hasMoreHistory = messages.length === HISTORY_PAGE_SIZE;
+        })
+        .catch(error => {
+            console.error('Error loading messages:', error);
+            showNotification('Failed to load messages', 'error');
+        });
+}
+
+function loadOlderMessages() {
+    if (!hasMoreHistory || loadingHistory || !selectedUserId) return;
+
+    loadingHistory = true;
+    const chatUserId = selectedUserId;
+    fetch(`/api/messages/${currentUser.user_id}/${chatUserId}?limit=${HISTORY_PAGE_SIZE}&before=${oldestMessageId}`)
+        .then(response => response.json())
+        .then(messages => {
+            if (chatUserId !== selectedUserId) return;
+
+            // Prepend while keeping the visible messages in place
+            const container = document.getElementById('messagesContainer');
+            const firstMessage = container.firstChild;
+            const previousHeight = container.scrollHeight;
+            messages.forEach(message => {
+                addMessage(message);
+                container.insertBefore(container.lastChild, firstMessage);
+            });
+            container.scrollTop += container.scrollHeight - previousHeight;
+
+            if (messages.length > 0) {
+                oldestMessageId = messages[0].id;
+            }
+            hasMoreHistory = messages.length === HISTORY_PAGE_SIZE;
+        })
+        .catch(error => {
+            console.error('Error loading older messages:', error);
+        })
+        .finally(() => {
+            loadingHistory = false;
+        });
+}
+
+function updateUserStatus(data) {
+    const userItem = document.querySelector(`.user-item[onclick*="${data.user_id}"]`);
+    if (userItem) {
+        const statusDot = userItem.querySelector('.status-dot');
+        statusDot.className = `status-dot ${data.status}`;
+    }
+}
+
+function handleFileUpload() {
+    const fileInput = document.getElementById('fileInput');
+    const file = fileInput.files[0];
+
+    if (!file || !selectedUserId) return;
+
+    if (file.size > 16 * 1024 * 1024) {
+        showNotification('File too large. Maximum size is 16MB.', 'error');
+        return;
+    }
+
+    const formData = new FormData();
+    formData.append('file', file);
+    formData.append('user_id', currentUser.user_id);
+
+    showNotification('Uploading file...', 'info');
+
+    fetch('/api/upload', {
+        method: 'POST',
+        body: formData
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.file_path) {
+            const clientMessageId = generateMessageId();
+            const messageData = {
+                sender_id: currentUser.user_id,
+                receiver_id: selectedUserId,
+                content: file.name,
+                message_type: 'file',
+                file_path: data.file_path,
+                client_message_id: clientMessageId
+            };
+
+            if (isConnected) {
+                socket.emit('send_message', messageData);
+            } else {
+                messageQueue.push(messageData);
+            }
+
+            showNotification('File uploaded successfully!', 'success');
+        } else {
+            showNotification('Upload failed: ' + data.error, 'error');
+        }
+    })
+    .catch(error => {
+        console.error('Upload error:', error);
+        showNotification('Upload failed', 'error');
+    })
+    .finally(() => {
+        fileInput.value = '';
+    });
+}
+
+function showNotification(message, type = 'info') {
+    const notification = document.getElementById('notification');
+    notification.textContent = message;
+    notification.className = `notification ${type}`;
+    notification.style.display = 'block';
+
+    setTimeout(() => {
+        notification.style.display = 'none';
+    }, 3000);
+}
+
+function handleTyping() {
+    if (!isTyping) {
+        isTyping = true;
+        // Implement typing indicator if needed
+    }
+
+    clearTimeout(typingTimer);
+    typingTimer = setTimeout(() => {
+        isTyping = false;
+        // Stop typing indicator
+    }, 1000);
+}
+
+// Video call functions (placeholder - implement with WebRTC)
+function initiateVideoCall() {
+    if (!selectedUserId) return;
+
+    showNotification('Video call feature coming soon!', 'info');
+    // Implement WebRTC video call logic
+}
+
+function toggleAudio() {
+    // Implement audio toggle
+}
+
+function toggleVideo() {
+    // Implement video toggle
+}
+
+function endCall() {
+    // Implement end call
+    document.getElementById('videoModal').style.display = 'none';
+}
+
+// Logout
+function logout() {
+    localStorage.removeItem('userData');
+    if (socket) socket.disconnect();
+    window.location.href = '/';
+}
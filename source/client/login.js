@@ -0,0 +1,221 @@
+let currentTab = 'login';
+
+// Tab switching
+function switchTab(tab) {
+    currentTab = tab;
+
+    // Update tab buttons
+    document.querySelectorAll('.tab-btn').forEach(btn => btn.classList.remove('active'));
+    event.target.classList.add('active');
+
+    // Update forms
+    document.getElementById('loginForm').style.display = tab === 'login' ? 'block' : 'none';
+    document.getElementById('registerForm').style.display = tab === 'register' ? 'block' : 'none';
+
+    // Clear messages
+    hideMessage();
+}
+
+// Form submissions
+document.getElementById('loginForm').addEventListener('submit', function(e) {
+    e.preventDefault();
+
+    const username = document.getElementById('loginUsername').value.trim();
+    const password = document.getElementById('loginPassword').value;
+
+    if (!username || !password) {
+        showError('Please fill in all fields');
+        return;
+    }
+
+    submitLogin(username, password);
+});
+
+document.getElementById('registerForm').addEventListener('submit', function(e) {
+    e.preventDefault();
+
+    const username = document.getElementById('registerUsername').value.trim();
+    const password = document.getElementById('registerPassword').value;
+    const confirmPassword = document.getElementById('confirmPassword').value;
+
+    if (!username || !password || !confirmPassword) {
+        showError('Please fill in all fields');
+        return;
+    }
+
+    if (username.length < 3) {
+        showError('Username must be at least 3 characters');
+        return;
+    }
+
+    if (password.length < 6) {
+        showError('Password must be at least 6 characters');
+        return;
+    }
+
+    if (password !== confirmPassword) {
+        showError('Passwords do not match');
+        return;
+    }
+
+    submitRegister(username, password);
+});
+
+// API calls
+function submitLogin(username, password) {
+    setLoading(true);
+    hideMessage();
+
+    fetch('/api/login', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            username: username,
+            password: password
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.error) {
+            showError(data.error);
+        } else {
+            showSuccess('Login successful! Redirecting...');
+            localStorage.setItem('userData', JSON.stringify(data));
+            setTimeout(() => {
+                window.location.href = '/chat';
+            }, 1000);
+        }
+    })
+    .catch(error => {
+        console.error('Login error:', error);
+        showError('Login failed. Please try again.');
+    })
+    .finally(() => {
+        setLoading(false);
+    });
+}
+
+function submitRegister(username, password) {
+    setLoading(true);
+    hideMessage();
+
+    fetch('/api/register', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            username: username,
+            password: password
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.error) {
+            showError(data.error);
+        } else {
+            showSuccess('Registration successful! Redirecting...');
+            localStorage.setItem('userData', JSON.stringify(data));
+            setTimeout(() => {
+                window.location.href = '/chat';
+            }, 1000);
+        }
+    })
+    .catch(error => {
+        console.error('Register error:', error);
+        showError('Registration failed. Please try again.');
+    })
+    .finally(() => {
+        setLoading(false);
+    });
+}
+
+// Quick login for demo
+function quickLogin(username, password) {
+    // Try login first
+    submitLogin(username, password);
+
+    // If login fails, auto-register then login
+    setTimeout(() => {
+        if (!localStorage.getItem('userData')) {
+            fetch('/api/register', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({
+                    username: username,
+                    password: password
+                })
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (data.user_id) {
+                    localStorage.setItem('userData', JSON.stringify(data));
+                    window.location.href = '/chat';
+                } else {
+                    // User exists, try login again
+                    submitLogin(username, password);
+                }
+            });
+        }
+    }, 1000);
+}
+
+// UI helpers
+function showError(message) {
+    const errorEl = document.getElementById('errorMessage');
+    errorEl.textContent = message;
+    errorEl.style.display = 'block';
+    document.getElementById('successMessage').style.display = 'none';
+}
+
+function showSuccess(message) {
+    const successEl = document.getElementById('successMessage');
+    successEl.textContent = message;
+    successEl.style.display = 'block';
+    document.getElementById('errorMessage').style.display = 'none';
+}
+
+function hideMessage() {
+    document.getElementById('errorMessage').style.display = 'none';
+    document.getElementById('successMessage').style.display = 'none';
+}
+
+function setLoading(loading) {
+    const loginBtn = document.getElementById('loginBtn');
+    const registerBtn = document.getElementById('registerBtn');
+
+    if (loading) {
+        loginBtn.disabled = true;
+        registerBtn.disabled = true;
+        loginBtn.textContent = 'Logging in...';
+        registerBtn.textContent = 'Registering...';
+    } else {
+        loginBtn.disabled = false;
+        registerBtn.disabled = false;
+        loginBtn.textContent = 'Login';
+        registerBtn.textContent = 'Register';
+    }
+}
+
+// Check if already logged in
+document.addEventListener('DOMContentLoaded', function() {
+    const userData = localStorage.getItem('userData');
+    if (userData) {
+        window.location.href = '/chat';
+    }
+});
+
+// Enter key support
+document.addEventListener('keypress', function(e) {
+    if (e.key === 'Enter') {
+        if (currentTab === 'login') {
+            document.getElementById('loginForm').dispatchEvent(new Event('submit'));
+        } else {
+            document.getElementById('registerForm').dispatchEvent(new Event('submit'));
+        }
+    }
+});
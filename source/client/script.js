@@ -1,11 +1,39 @@
+// Needs the global `io` from a socket.io client bundle matching the server's
+// SOCKETIO_SERIALIZER: socket.io.min.js for JSON, socket.io.msgpack.min.js for msgpack.
 const socket = io("http://localhost:5000");
 const localVideo = document.getElementById("localVideo");
 const remoteVideo = document.getElementById("remoteVideo");
 
-let localStream, peerConnection;
-const config = { iceServers: [{ urls: "stun:stun.l.google.com:19302" }] };
+let localStream, peerConnection, callId, statsTimer;
+const STATS_INTERVAL_MS = 10000;
+// ICE servers (STUN + short-lived TURN credentials) come from the server, see
+// getIceConfig(); this fallback is only used if that request fails. TURN
+// credentials are only issued to a socket the user has joined on.
+let config = { iceServers: [{ urls: "stun:stun.l.google.com:19302" }] };
+let configExpiresAt = 0;
+
+socket.on("connect", () => {
+  const userId = currentUserId();
+  if (userId) socket.emit("join", { user_id: userId });
+});
+
+// Ask for a fresh config only when the cached TURN credentials are about to expire
+async function getIceConfig() {
+  if (configExpiresAt === null || configExpiresAt - 60 > Date.now() / 1000) return config;
+  const response = await new Promise((resolve) => {
+    socket.emit("get_ice_servers", { user_id: currentUserId() }, resolve);
+    setTimeout(resolve, 3000);
+  });
+  if (response && response.iceServers) {
+    config = { iceServers: response.iceServers };
+    configExpiresAt = response.expires_at;
+  }
+  return config;
+}
 
 socket.on("offer", async (offer) => {
+  callId = offer.call_id || crypto.randomUUID();
+  await getIceConfig();
   peerConnection = createPeerConnection();
   await peerConnection.setRemoteDescription(offer);
   const answer = await peerConnection.createAnswer();
@@ -29,20 +57,79 @@ function createPeerConnection() {
   pc.ontrack = (event) => {
     remoteVideo.srcObject = event.streams[0];
   };
+  pc.onconnectionstatechange = () => {
+    if (pc.connectionState === "connected") startCallStats(pc);
+    if (["closed", "failed"].includes(pc.connectionState)) stopCallStats();
+  };
   localStream.getTracks().forEach((track) => pc.addTrack(track, localStream));
   return pc;
 }
 
+// Call quality telemetry: every STATS_INTERVAL_MS send a compact getStats
+// summary (RTT, jitter, packet loss and bitrate since the previous sample,
+// candidate type of the selected pair) as a "call_stats" event.
+function startCallStats(pc) {
+  stopCallStats();
+  let previous = null;
+  statsTimer = setInterval(async () => {
+    const report = await pc.getStats();
+    let pair = null;
+    const inbound = { bytes: 0, packets: 0, lost: 0, jitter: 0 };
+    report.forEach((stat) => {
+      if (stat.type === "candidate-pair" && stat.nominated && stat.state === "succeeded") pair = stat;
+      if (stat.type === "inbound-rtp") {
+        inbound.bytes += stat.bytesReceived || 0;
+        inbound.packets += stat.packetsReceived || 0;
+        inbound.lost += stat.packetsLost || 0;
+        inbound.jitter = Math.max(inbound.jitter, stat.jitter || 0);
+      }
+    });
+    if (!pair) return;
+
+    const local = report.get(pair.localCandidateId);
+    const remote = report.get(pair.remoteCandidateId);
+    const relayed = [local, remote].some((c) => c && c.candidateType === "relay");
+    const sample = {
+      call_id: callId,
+      rtt_ms: (pair.currentRoundTripTime || 0) * 1000,
+      jitter_ms: inbound.jitter * 1000,
+      candidate_type: relayed ? "relay" : local && local.candidateType,
+    };
+    const now = performance.now();
+    if (previous) {
+      const packets = inbound.packets - previous.packets;
+      const lost = inbound.lost - previous.lost;
+      sample.packet_loss = packets + lost > 0 ? (100 * lost) / (packets + lost) : 0;
+      sample.bitrate_kbps = ((inbound.bytes - previous.bytes) * 8) / (now - previous.time);
+    }
+    previous = { ...inbound, time: now };
+    socket.emit("call_stats", sample);
+  }, STATS_INTERVAL_MS);
+}
+
+function currentUserId() {
+  // Set by the login page, see templates/index.html
+  return JSON.parse(localStorage.getItem("userData") || "{}").user_id;
+}
+
+function stopCallStats() {
+  clearInterval(statsTimer);
+  statsTimer = null;
+}
+
 document.getElementById("startBtn").onclick = async () => {
   localStream = await navigator.mediaDevices.getUserMedia({ video: true, audio: true });
   localVideo.srcObject = localStream;
+  callId = crypto.randomUUID();
+  await getIceConfig();
   peerConnection = createPeerConnection();
   const offer = await peerConnection.createOffer();
   await peerConnection.setLocalDescription(offer);
-  socket.emit("offer", offer);
+  socket.emit("offer", { type: offer.type, sdp: offer.sdp, call_id: callId });
 };
 
 document.getElementById("endBtn").onclick = () => {
+  stopCallStats();
   peerConnection.close();
   socket.disconnect();
 };
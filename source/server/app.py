@@ -4,59 +4,189 @@ import sqlite3
 import os
 import uuid
 from werkzeug.utils import secure_filename
+from werkzeug.middleware.proxy_fix import ProxyFix
 from datetime import datetime, timedelta
 import json
 import hashlib
+import functools
+import shutil
+import sys
+import threading
+import time
+import bisect
+import collections
+import math
+import base64
+import hmac
+import click
+import gzip
+import mimetypes
+import csv
+import io
+import re
+from urllib.request import pathname2url
+
+try:
+    import brotli
+except ImportError:  # optional: without it pages are only gzip-compressed
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single `python app.py` process, nothing to serialize
+    fcntl = None
 
 # Sửa đường dẫn templates để tìm thư mục templates từ root project
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
 template_dir = os.path.join(project_root, 'templates')
 upload_dir = os.path.join(project_root, 'uploads')
+client_dir = os.path.join(project_root, 'source', 'client')
 
 app = Flask(__name__, template_folder=template_dir)
 app.config['SECRET_KEY'] = 'your_secret_key_here'
 app.config['UPLOAD_FOLDER'] = upload_dir
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+# Upload garbage collection: every UPLOAD_GC_INTERVAL seconds (0 disables) files
+# that no message references and that are older than UPLOAD_GRACE_SECONDS are
+# deleted. UPLOAD_QUOTA_BYTES caps each user's stored uploads (0 = unlimited).
+app.config['UPLOAD_GC_INTERVAL'] = int(os.environ.get('UPLOAD_GC_INTERVAL', 3600))
+app.config['UPLOAD_GRACE_SECONDS'] = int(os.environ.get('UPLOAD_GRACE_SECONDS', 24 * 3600))
+app.config['UPLOAD_QUOTA_BYTES'] = int(os.environ.get('UPLOAD_QUOTA_BYTES', 500 * 1024 * 1024))
+
+# Rendered pages and source/client assets are kept in memory with precomputed
+# gzip/brotli variants and ETags. Assets are linked through content-hashed URLs
+# (asset_url('chat.js') -> /assets/chat.<hash>.js) that browsers cache for a
+# year; pages are revalidated with If-None-Match. PAGE_CACHE=0 re-renders and
+# re-reads on every request, uncompressed, for editing templates locally.
+app.config['PAGE_CACHE'] = os.environ.get('PAGE_CACHE', '1') != '0'
+
+# Number of reverse proxies in front of the app (Render, Heroku: 1). Their
+# X-Forwarded-For/-Proto headers are trusted, so request.remote_addr is the real
+# client and HTTP rate limits are per client rather than per proxy. Leave at 0
+# when clients connect directly, otherwise they could spoof the header.
+app.config['TRUSTED_PROXIES'] = int(os.environ.get('TRUSTED_PROXIES', 0))
+if app.config['TRUSTED_PROXIES']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'],
+                            x_proto=app.config['TRUSTED_PROXIES'])
+
+# Token-bucket budgets per connection: rate = tokens/second, burst = bucket size.
+# 'drop' rejects over-budget events, 'queue' delays them up to max_delay seconds.
+# Override with RATE_LIMITS='{"send_message": {"rate": 10}}' in the environment;
+# RATE_LIMITS=off disables all limits (load tests).
+app.config['RATE_LIMITS'] = {
+    'join': {'rate': 1, 'burst': 5, 'policy': 'drop'},
+    'send_message': {'rate': 5, 'burst': 20, 'policy': 'drop', 'notify': True},
+    'call_user': {'rate': 0.5, 'burst': 3, 'policy': 'drop', 'notify': True},
+    'call_accepted': {'rate': 0.5, 'burst': 3, 'policy': 'drop'},
+    'call_rejected': {'rate': 0.5, 'burst': 3, 'policy': 'drop'},
+    'offer': {'rate': 1, 'burst': 5, 'policy': 'queue', 'max_delay': 2},
+    'answer': {'rate': 1, 'burst': 5, 'policy': 'queue', 'max_delay': 2},
+    'ice-candidate': {'rate': 20, 'burst': 50, 'policy': 'queue', 'max_delay': 1},
+    'upload': {'rate': 0.5, 'burst': 5, 'policy': 'drop'},
+    'call_stats': {'rate': 1, 'burst': 5, 'policy': 'drop'},
+    'ice_servers': {'rate': 0.2, 'burst': 5, 'policy': 'drop'},
+    'export': {'rate': 0.05, 'burst': 2, 'policy': 'drop'},
+}
+if os.environ.get('RATE_LIMITS', '').strip().lower() == 'off':
+    app.config['RATE_LIMITS'] = {}
+else:
+    for _event, _override in json.loads(os.environ.get('RATE_LIMITS') or '{}').items():
+        app.config['RATE_LIMITS'].setdefault(_event, {}).update(_override)
 
-# Ensure upload directory exists
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Wire format for Socket.IO payloads: 'default' (JSON text) or 'msgpack' (binary).
+# The client page must load the matching socket.io bundle, see chat().
+app.config['SOCKETIO_SERIALIZER'] = os.environ.get('SOCKETIO_SERIALIZER', 'default')
 
-# Debug paths
-print(f"🔍 Project root: {project_root}")
-print(f"📁 Template directory: {template_dir}")
-print(f"📂 Upload directory: {upload_dir}")
-print(f"📄 Template exists: {os.path.exists(template_dir)}")
-print(f"📄 Index.html exists: {os.path.exists(os.path.join(template_dir, 'index.html'))}")
-print(f"📂 Upload folder exists: {os.path.exists(upload_dir)}")
+# WebSocket frames are compressed with permessage-deflate when the browser offers
+# it (simple-websocket negotiates it); long-polling responses above this size
+# are gzip/deflate compressed.
+app.config['SOCKETIO_COMPRESSION_THRESHOLD'] = int(os.environ.get('SOCKETIO_COMPRESSION_THRESHOLD', 512))
+
+# 'threading' for `python app.py`, 'gevent' under the gunicorn gevent worker (Procfile).
+# For the asyncio/ASGI deployment see asgi_app.py.
+app.config['SOCKETIO_ASYNC_MODE'] = os.environ.get('SOCKETIO_ASYNC_MODE', 'threading')
+
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=app.config['SOCKETIO_ASYNC_MODE'],
+                    serializer=app.config['SOCKETIO_SERIALIZER'],
+                    http_compression=True,
+                    compression_threshold=app.config['SOCKETIO_COMPRESSION_THRESHOLD'])
 
 # Database initialization with password support
-# Database path for Render
-DATABASE_PATH = '/tmp/chat_app.db'
+# Point DATABASE_PATH at a persistent disk in production; the default is the
+# messenger.db in the project root that db_viewer.py/show_db.py also open.
+DATABASE_PATH = os.environ.get('DATABASE_PATH', os.path.join(project_root, 'messenger.db'))
 
-def ensure_db_exists():
-    """Ensure database exists and is initialized"""
-    try:
-        # Check if database file exists
-        if not os.path.exists(DATABASE_PATH):
-            print(f"🔧 Database doesn't exist, creating: {DATABASE_PATH}")
-        
-        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
-        cursor = conn.cursor()
-        
-        # Create users table
-        cursor.execute('''
+# Online backup: a background job copies the live database to BACKUP_PATH
+# every BACKUP_INTERVAL seconds, BACKUP_PAGES_PER_STEP pages at a time with a
+# short pause in between so writers are never blocked for long. Disabled when
+# DATABASE_BACKUP_PATH is not set.
+app.config['BACKUP_PATH'] = os.environ.get('DATABASE_BACKUP_PATH')
+app.config['BACKUP_INTERVAL'] = int(os.environ.get('BACKUP_INTERVAL', 3600))
+app.config['BACKUP_PAGES_PER_STEP'] = int(os.environ.get('BACKUP_PAGES_PER_STEP', 1024))
+app.config['BACKUP_STEP_SLEEP'] = float(os.environ.get('BACKUP_STEP_SLEEP', 0.005))
+
+# Retention: messages older than RETENTION_DAYS move to one archive database
+# file per month (ARCHIVE_DIR/messages_YYYY_MM.db) in batches of
+# ARCHIVE_BATCH_SIZE rows, and the freed pages are released with incremental
+# vacuum. The history endpoint reads through to the archives. 0 disables it.
+app.config['RETENTION_DAYS'] = int(os.environ.get('RETENTION_DAYS', 0))
+app.config['ARCHIVE_DIR'] = os.environ.get(
+    'ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(DATABASE_PATH)), 'archive'))
+app.config['ARCHIVE_INTERVAL'] = int(os.environ.get('ARCHIVE_INTERVAL', 600))
+app.config['ARCHIVE_BATCH_SIZE'] = int(os.environ.get('ARCHIVE_BATCH_SIZE', 500))
+app.config['ARCHIVE_BATCH_PAUSE'] = float(os.environ.get('ARCHIVE_BATCH_PAUSE', 0.05))
+
+# Call quality telemetry: clients send a getStats summary ('call_stats') every
+# few seconds during a call. Samples are queued in memory (at most
+# CALL_STATS_QUEUE_MAX) and flushed every CALL_STATS_FLUSH_INTERVAL seconds
+# into per-call histogram rollups of CALL_STATS_BUCKET_SECONDS, kept for
+# CALL_STATS_RETENTION_DAYS. An interval of 0 disables ingestion.
+app.config['CALL_STATS_FLUSH_INTERVAL'] = float(os.environ.get('CALL_STATS_FLUSH_INTERVAL', 5))
+app.config['CALL_STATS_BUCKET_SECONDS'] = int(os.environ.get('CALL_STATS_BUCKET_SECONDS', 60))
+app.config['CALL_STATS_RETENTION_DAYS'] = int(os.environ.get('CALL_STATS_RETENTION_DAYS', 30))
+app.config['CALL_STATS_QUEUE_MAX'] = int(os.environ.get('CALL_STATS_QUEUE_MAX', 10000))
+
+# Analytics: daily_user_stats is folded forward from the messages added since
+# the previous run (every ANALYTICS_INTERVAL seconds, 0 disables the job),
+# ANALYTICS_BATCH_SIZE rows at a time, so reports never scan the live messages
+# table. Export jobs stream messages to EXPORT_DIR in EXPORT_CHUNK_SIZE-row
+# chunks; finished files are deleted after EXPORT_TTL seconds. The export and
+# analytics APIs need an X-Export-Token header matching EXPORT_TOKEN and are off
+# without it; `flask export` works either way.
+app.config['ANALYTICS_INTERVAL'] = int(os.environ.get('ANALYTICS_INTERVAL', 300))
+app.config['ANALYTICS_BATCH_SIZE'] = int(os.environ.get('ANALYTICS_BATCH_SIZE', 5000))
+app.config['EXPORT_DIR'] = os.environ.get(
+    'EXPORT_DIR', os.path.join(os.path.dirname(os.path.abspath(DATABASE_PATH)), 'exports'))
+app.config['EXPORT_CHUNK_SIZE'] = int(os.environ.get('EXPORT_CHUNK_SIZE', 1000))
+app.config['EXPORT_TTL'] = int(os.environ.get('EXPORT_TTL', 24 * 3600))
+app.config['EXPORT_TOKEN'] = os.environ.get('EXPORT_TOKEN')
+
+# ICE servers handed to RTCPeerConnection (comma separated URLs). With
+# TURN_SECRET set (coturn's static-auth-secret), a user joined on a socket gets
+# TURN credentials valid for TURN_TTL seconds in the TURN REST API scheme:
+# username "<expiry>:<user_id>", credential base64(HMAC-SHA1(secret, username)).
+# They are cached per user and reissued TURN_REFRESH_MARGIN seconds before expiry.
+app.config['STUN_URLS'] = [u.strip() for u in os.environ.get(
+    'STUN_URLS', 'stun:stun.l.google.com:19302').split(',') if u.strip()]
+app.config['TURN_URLS'] = [u.strip() for u in os.environ.get('TURN_URLS', '').split(',') if u.strip()]
+app.config['TURN_SECRET'] = os.environ.get('TURN_SECRET')
+app.config['TURN_TTL'] = int(os.environ.get('TURN_TTL', 2 * 3600))
+app.config['TURN_REFRESH_MARGIN'] = int(os.environ.get('TURN_REFRESH_MARGIN', 900))
+
+# Schema migrations: SCHEMA_MIGRATIONS[n] upgrades a database from
+# PRAGMA user_version n to n + 1. Append new steps, never edit old ones.
+SCHEMA_MIGRATIONS = [
+    [
+        '''
             CREATE TABLE IF NOT EXISTS users (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 username TEXT UNIQUE NOT NULL,
                 password_hash TEXT NOT NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
-        ''')
-        
-        # Create messages table
-        cursor.execute('''
+        ''',
+        '''
             CREATE TABLE IF NOT EXISTS messages (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 sender_id INTEGER,
@@ -66,24 +196,1030 @@ def ensure_db_exists():
                 file_path TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
-        ''')
+        ''',
+        # Conversation history and retention scans
+        '''
+            CREATE INDEX IF NOT EXISTS idx_messages_conversation
+            ON messages (sender_id, receiver_id, id)
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_messages_created_at ON messages (created_at)',
+        # Covering index for the upload sweeper's referenced-files set
+        '''
+            CREATE INDEX IF NOT EXISTS idx_messages_file_path
+            ON messages (file_path, sender_id) WHERE file_path IS NOT NULL
+        ''',
+    ],
+    [
+        # One row per call, reporting user and time bucket; histograms is the
+        # JSON rollup built by add_call_sample()
+        '''
+            CREATE TABLE IF NOT EXISTS call_stats_rollup (
+                bucket_start INTEGER NOT NULL,
+                call_id TEXT NOT NULL,
+                user_id INTEGER NOT NULL DEFAULT 0,
+                samples INTEGER NOT NULL,
+                relay_samples INTEGER NOT NULL,
+                candidate_type TEXT,
+                histograms TEXT NOT NULL,
+                PRIMARY KEY (bucket_start, call_id, user_id)
+            )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_call_stats_call ON call_stats_rollup (call_id, bucket_start)',
+    ],
+    [
+        # Per-user daily counters maintained by update_daily_stats()
+        '''
+            CREATE TABLE IF NOT EXISTS daily_user_stats (
+                day TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                messages_sent INTEGER NOT NULL DEFAULT 0,
+                messages_received INTEGER NOT NULL DEFAULT 0,
+                uploads INTEGER NOT NULL DEFAULT 0,
+                upload_bytes INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, day)
+            )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_daily_user_stats_day ON daily_user_stats (day)',
+        # Progress markers of incremental jobs, e.g. the last message id counted
+        '''
+            CREATE TABLE IF NOT EXISTS analytics_state (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        ''',
+    ],
+]
+SCHEMA_VERSION = len(SCHEMA_MIGRATIONS)
+
+def ensure_db_exists():
+    """Ensure database exists and its schema is at SCHEMA_VERSION.
+
+    On an up-to-date database this is a single PRAGMA read. Workers booting at
+    the same time serialize on BEGIN IMMEDIATE and re-check the version, so the
+    migrations run once per deployment, not once per worker.
+    """
+    try:
+        # Check if database file exists
+        if not os.path.exists(DATABASE_PATH):
+            print(f"🔧 Database doesn't exist, creating: {DATABASE_PATH}")
         
-        conn.commit()
-        conn.close()
-        print("✅ Database tables ensured")
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False, isolation_level=None)
+        try:
+            if conn.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+                return True
+            
+            # Only takes effect on a new, empty database; an existing one needs a
+            # single manual VACUUM to switch (see archive_loop)
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            
+            # WAL lets readers (and the online backup) run alongside writers
+            conn.execute('PRAGMA journal_mode=WAL')
+            
+            conn.execute('BEGIN IMMEDIATE')
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            for statements in SCHEMA_MIGRATIONS[version:]:
+                for statement in statements:
+                    conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            conn.execute('COMMIT')
+            if version < SCHEMA_VERSION:
+                print(f"✅ Database schema migrated from v{version} to v{SCHEMA_VERSION}")
+        finally:
+            conn.close()
         return True
     except Exception as e:
         print(f"❌ Database initialization error: {str(e)}")
         return False
 
+def backup_database(source_path, target_path, pages_per_step=1024, step_sleep=0.005):
+    """Copy a live database with SQLite's online backup API.
+
+    Pages are copied in small steps with a pause in between. In WAL mode the
+    copy reads from a read transaction pinned for the whole backup, so writers
+    are never blocked and their commits do not force SQLite to restart the copy.
+    In rollback-journal mode the source is unlocked between steps instead and
+    concurrent writes restart the copy; restarts are counted in the returned
+    stats. The snapshot is written next to target_path under a per-process name
+    and renamed into place, so the target is always a complete database.
+    """
+    tmp_path = f'{target_path}.tmp-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+    stats = {'pages': 0, 'steps': 0, 'restarts': 0}
+    last_remaining = [None]
+
+    def progress(status, remaining, total):
+        stats['steps'] += 1
+        stats['pages'] = total
+        if last_remaining[0] is not None and remaining > last_remaining[0]:
+            stats['restarts'] += 1
+        last_remaining[0] = remaining
+        if remaining and step_sleep:
+            time.sleep(step_sleep)
+
+    started = time.time()
+    try:
+        source = sqlite3.connect(source_path, check_same_thread=False, isolation_level=None)
+        target = sqlite3.connect(tmp_path)
+        try:
+            stats['wal'] = source.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+            if stats['wal']:
+                source.execute('BEGIN')
+                source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+            source.backup(target, pages=pages_per_step, progress=progress)
+        finally:
+            target.close()
+            source.close()
+        os.replace(tmp_path, target_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    stats['seconds'] = time.time() - started
+    return stats
+
+def restore_db_from_backup():
+    """Restore DATABASE_PATH from the latest backup if the database is missing.
+
+    Backups are complete database files, so restoring is a plain file copy
+    (kernel copy_file_range/sendfile on Linux) instead of a page-by-page replay.
+    Workers booting together serialize on a lock file and re-check under it, so
+    only the first one restores and the rest open its result.
+    """
+    backup_path = app.config['BACKUP_PATH']
+    if os.path.exists(DATABASE_PATH) or not backup_path or not os.path.exists(backup_path):
+        return False
+
+    with open(DATABASE_PATH + '.restore.lock', 'w') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(DATABASE_PATH):
+            return False
+
+        with open(backup_path, 'rb') as f:
+            if f.read(16) != b'SQLite format 3\x00':
+                print(f"❌ Backup is not a SQLite database, not restoring: {backup_path}")
+                return False
+
+        started = time.time()
+        tmp_path = f'{DATABASE_PATH}.restore-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        try:
+            shutil.copyfile(backup_path, tmp_path)
+            os.replace(tmp_path, DATABASE_PATH)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        print(f"♻️  Restored database from {backup_path} "
+              f"({os.path.getsize(DATABASE_PATH):,} bytes in {time.time() - started:.2f}s)")
+        return True
+
+_background_jobs = set()
+_background_jobs_lock = threading.Lock()
+
+def start_background_job(name, target):
+    """Start target as a background task unless name already runs in this process"""
+    with _background_jobs_lock:
+        if name in _background_jobs:
+            return False
+        _background_jobs.add(name)
+    socketio.start_background_task(target)
+    return True
+
+def backup_once():
+    """Back up to BACKUP_PATH unless another worker is at it or just did it.
+
+    Every worker runs backup_loop; a non-blocking lock on BACKUP_PATH.lock lets
+    one of them copy while the others skip, and a backup younger than half an
+    interval is not redone by a worker whose timer fires a little later.
+    Returns the backup stats, or None when skipped.
+    """
+    backup_path = app.config['BACKUP_PATH']
+    with open(backup_path + '.lock', 'w') as lock:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+        if os.path.exists(backup_path) and \
+                time.time() - os.path.getmtime(backup_path) < app.config['BACKUP_INTERVAL'] / 2:
+            return None
+        return backup_database(DATABASE_PATH, backup_path,
+                               app.config['BACKUP_PAGES_PER_STEP'],
+                               app.config['BACKUP_STEP_SLEEP'])
+
+def backup_loop():
+    backup_path = app.config['BACKUP_PATH']
+    while True:
+        socketio.sleep(app.config['BACKUP_INTERVAL'])
+        try:
+            stats = backup_once()
+            if stats:
+                print(f"💾 Database backed up to {backup_path}: {stats['pages']} pages, "
+                      f"{stats['steps']} steps, {stats['restarts']} restarts, {stats['seconds']:.2f}s")
+        except Exception as e:
+            print(f"❌ Database backup error: {str(e)}")
+
+def start_backup_job():
+    """Start the periodic backup in the background (once per process)"""
+    if not app.config['BACKUP_PATH']:
+        return False
+    os.makedirs(os.path.dirname(os.path.abspath(app.config['BACKUP_PATH'])), exist_ok=True)
+    if not start_background_job('backup', backup_loop):
+        return False
+    print(f"💾 Backup job: every {app.config['BACKUP_INTERVAL']}s to {app.config['BACKUP_PATH']}")
+    return True
+
+# Column list shared by the live table and the monthly archives
+MESSAGE_COLUMNS = 'id, sender_id, receiver_id, content, message_type, file_path, created_at'
+
+def archive_path(month):
+    """Archive database file for a 'YYYY-MM' month"""
+    return os.path.join(app.config['ARCHIVE_DIR'], f"messages_{month.replace('-', '_')}.db")
+
+def list_archive_months():
+    """Archived months, newest first"""
+    archive_dir = app.config['ARCHIVE_DIR']
+    if not os.path.isdir(archive_dir):
+        return []
+    months = []
+    for name in os.listdir(archive_dir):
+        if name.startswith('messages_') and name.endswith('.db'):
+            months.append(name[len('messages_'):-len('.db')].replace('_', '-'))
+    return sorted(months, reverse=True)
+
+def archive_old_messages(batch_size=None, retention_days=None):
+    """Move one batch of messages older than the retention window to the archives.
+
+    Rows are copied with INSERT OR IGNORE and committed before they are deleted
+    from the live table, so a crash in between only leaves duplicates that the
+    next batch skips. Returns the number of rows moved.
+    """
+    batch_size = batch_size or app.config['ARCHIVE_BATCH_SIZE']
+    retention_days = retention_days if retention_days is not None else app.config['RETENTION_DAYS']
+    cutoff = (datetime.utcnow() - timedelta(days=retention_days)).strftime('%Y-%m-%d %H:%M:%S')
+
+    conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+    try:
+        rows = conn.execute(f'''
+            SELECT {MESSAGE_COLUMNS} FROM messages
+            WHERE created_at < ?
+            ORDER BY created_at
+            LIMIT ?
+        ''', (cutoff, batch_size)).fetchall()
+        if not rows:
+            return 0
+
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(str(row[6])[:7], []).append(row)
+
+        os.makedirs(app.config['ARCHIVE_DIR'], exist_ok=True)
+        for month, month_rows in by_month.items():
+            conn.execute('ATTACH DATABASE ? AS archive', (archive_path(month),))
+            try:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS archive.messages (
+                        id INTEGER PRIMARY KEY,
+                        sender_id INTEGER,
+                        receiver_id INTEGER,
+                        content TEXT,
+                        message_type TEXT DEFAULT 'text',
+                        file_path TEXT,
+                        created_at TIMESTAMP
+                    )
+                ''')
+                conn.execute('''
+                    CREATE INDEX IF NOT EXISTS archive.idx_messages_conversation
+                    ON messages (sender_id, receiver_id, id)
+                ''')
+                conn.executemany(f'INSERT OR IGNORE INTO archive.messages ({MESSAGE_COLUMNS}) '
+                                 'VALUES (?, ?, ?, ?, ?, ?, ?)', month_rows)
+                conn.commit()
+            finally:
+                conn.execute('DETACH DATABASE archive')
+
+        conn.executemany('DELETE FROM messages WHERE id = ?', [(row[0],) for row in rows])
+        conn.commit()
+        return len(rows)
+    finally:
+        conn.close()
+
+def reclaim_free_pages(step_pages=1000):
+    """Release every free page to the filesystem, step_pages at a time. Returns bytes reclaimed.
+
+    Each incremental_vacuum step is its own short write transaction; pausing
+    between steps keeps a large cleanup from holding the write lock for long.
+    """
+    conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+    try:
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        before = remaining = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        while remaining:
+            # executescript steps the pragma to completion; execute() would free one page
+            conn.executescript(f'PRAGMA incremental_vacuum({int(step_pages)});')
+            left = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if left >= remaining:  # auto_vacuum is not INCREMENTAL, nothing to release
+                break
+            remaining = left
+            if remaining:
+                socketio.sleep(app.config['ARCHIVE_BATCH_PAUSE'])
+        return (before - remaining) * page_size
+    finally:
+        conn.close()
+
+def archive_loop():
+    conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        print("⚠️  auto_vacuum is not INCREMENTAL on this database; archived space is reused "
+              "but not returned to disk until you run: PRAGMA auto_vacuum=INCREMENTAL; VACUUM;")
+    conn.close()
+
+    while True:
+        try:
+            moved = 0
+            while True:
+                batch = archive_old_messages()
+                moved += batch
+                if batch < app.config['ARCHIVE_BATCH_SIZE']:
+                    break
+                socketio.sleep(app.config['ARCHIVE_BATCH_PAUSE'])
+            if moved:
+                reclaimed = reclaim_free_pages()
+                print(f"🗄️  Archived {moved} messages older than {app.config['RETENTION_DAYS']} days, "
+                      f"reclaimed {reclaimed:,} bytes")
+        except Exception as e:
+            print(f"❌ Archive error: {str(e)}")
+        socketio.sleep(app.config['ARCHIVE_INTERVAL'])
+
+def start_archive_job():
+    """Start the retention/archival job in the background (once per process)"""
+    if app.config['RETENTION_DAYS'] <= 0:
+        return False
+    if not start_background_job('archive', archive_loop):
+        return False
+    print(f"🗄️  Archive job: keeping {app.config['RETENTION_DAYS']} days hot, "
+          f"archives in {app.config['ARCHIVE_DIR']}")
+    return True
+
+# Bytes of stored uploads per user, recomputed by sweep_uploads() and bumped
+# on every upload; pending_uploads holds files not yet referenced by a message.
+# Uploads sent without a user_id are counted against upload_quota_key()'s
+# client address key until a message references them.
+upload_usage = {}
+pending_uploads = {}  # filename -> user_id or client address key
+upload_usage_lock = threading.Lock()
+upload_usage_ready = False
+last_upload_sweep = {}
+
+def referenced_upload_files():
+    """file_path -> sender_id for every upload referenced by a live or archived message"""
+    conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+    try:
+        query = 'SELECT file_path, sender_id FROM {} WHERE file_path IS NOT NULL'
+        referenced = dict(conn.execute(query.format('messages')))
+        for month in list_archive_months():
+            conn.execute('ATTACH DATABASE ? AS archive', (archive_path(month),))
+            try:
+                referenced.update(conn.execute(query.format('archive.messages')))
+            finally:
+                conn.execute('DETACH DATABASE archive')
+        return referenced
+    finally:
+        conn.close()
+
+def sweep_uploads(grace_seconds=None):
+    """Delete orphaned uploads past the grace period and recompute per-user usage.
+
+    The upload directory is scanned once and checked against a set of referenced
+    file names built from one indexed query, instead of querying per file.
+    """
+    global upload_usage_ready
+    grace_seconds = app.config['UPLOAD_GRACE_SECONDS'] if grace_seconds is None else grace_seconds
+    started = time.time()
+    referenced = referenced_upload_files()
+    cutoff = started - grace_seconds
+
+    report = {'scanned': 0, 'deleted': 0, 'reclaimed_bytes': 0, 'kept_bytes': 0,
+              'pending': 0, 'users_over_quota': [], 'anonymous_over_quota': 0}
+    usage = {}
+    with upload_usage_lock:
+        pending = dict(pending_uploads)
+
+    with os.scandir(app.config['UPLOAD_FOLDER']) as entries:
+        files = [(e.name, e.stat()) for e in entries if e.is_file()]
+
+    # An empty reference set next to existing files usually means DATABASE_PATH
+    # points at the wrong database; never wipe the directory in that case.
+    safe_to_delete = bool(referenced) or not files
+    if not safe_to_delete:
+        print("⚠️  No message references any upload, skipping orphan deletion")
+
+    for name, stat in files:
+        report['scanned'] += 1
+        if name in referenced:
+            sender_id = referenced[name]
+            usage[sender_id] = usage.get(sender_id, 0) + stat.st_size
+            report['kept_bytes'] += stat.st_size
+        elif stat.st_mtime >= cutoff or not safe_to_delete:
+            if name in pending:
+                usage[pending[name]] = usage.get(pending[name], 0) + stat.st_size
+            report['pending'] += 1
+            report['kept_bytes'] += stat.st_size
+        else:
+            try:
+                os.remove(os.path.join(app.config['UPLOAD_FOLDER'], name))
+                report['deleted'] += 1
+                report['reclaimed_bytes'] += stat.st_size
+            except OSError as e:
+                print(f"❌ Could not delete orphaned upload {name}: {e}")
+
+    with upload_usage_lock:
+        for name in list(pending_uploads):
+            path = os.path.join(app.config['UPLOAD_FOLDER'], name)
+            if name in referenced or not os.path.exists(path):
+                del pending_uploads[name]
+            elif name not in pending:  # uploaded while this sweep was scanning
+                owner = pending_uploads[name]
+                usage[owner] = usage.get(owner, 0) + os.path.getsize(path)
+        upload_usage.clear()
+        upload_usage.update(usage)
+        upload_usage_ready = True
+
+    quota = app.config['UPLOAD_QUOTA_BYTES']
+    if quota:
+        # Client address keys are counted, never published
+        over = [key for key, used in usage.items() if used > quota]
+        report['users_over_quota'] = sorted(key for key in over if not is_address_key(key))
+        report['anonymous_over_quota'] = sum(1 for key in over if is_address_key(key))
+    report['seconds'] = time.time() - started
+    report['finished_at'] = datetime.now().isoformat()
+    last_upload_sweep.clear()
+    last_upload_sweep.update(report)
+    return report
+
+def upload_gc_loop():
+    while True:
+        try:
+            report = sweep_uploads()
+            print(f"🧹 Upload sweep: {report['scanned']} files, deleted {report['deleted']} orphans, "
+                  f"reclaimed {report['reclaimed_bytes']:,} bytes in {report['seconds']:.2f}s")
+            if report['users_over_quota'] or report['anonymous_over_quota']:
+                print(f"⚠️  Users over upload quota: {report['users_over_quota']}, "
+                      f"anonymous clients: {report['anonymous_over_quota']}")
+        except Exception as e:
+            print(f"❌ Upload sweep error: {str(e)}")
+        socketio.sleep(app.config['UPLOAD_GC_INTERVAL'])
+
+def start_upload_gc_job():
+    """Start the upload sweeper in the background (once per process)
+
+    The sweeper's first pass seeds upload_usage for the quota check. With the
+    sweeper disabled a one-off, delete-nothing pass seeds it instead, so no
+    upload request ever has to scan the directory itself.
+    """
+    if app.config['UPLOAD_GC_INTERVAL'] <= 0:
+        if app.config['UPLOAD_QUOTA_BYTES']:
+            start_background_job('upload_usage', lambda: sweep_uploads(grace_seconds=sys.maxsize))
+        return False
+    if not start_background_job('upload_gc', upload_gc_loop):
+        return False
+    print(f"🧹 Upload sweeper: every {app.config['UPLOAD_GC_INTERVAL']}s, "
+          f"grace {app.config['UPLOAD_GRACE_SECONDS']}s")
+    return True
+
+# Histogram bin upper edges per call_stats metric; values above the last edge
+# land in an overflow bin. packet_loss is a percentage.
+CALL_STATS_METRICS = {
+    'rtt_ms': [10, 20, 30, 50, 75, 100, 150, 200, 300, 500, 750, 1000, 2000],
+    'jitter_ms': [1, 2, 5, 10, 20, 30, 50, 100, 200],
+    'packet_loss': [0.1, 0.5, 1, 2, 3, 5, 10, 20, 50],
+    'bitrate_kbps': [50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000],
+}
+CANDIDATE_TYPES = ('host', 'srflx', 'prflx', 'relay')
+
+# Samples waiting for the next flush: (received_at, sample)
+call_stats_queue = collections.deque()
+call_stats_metrics = {'received': 0, 'dropped': 0, 'flushed': 0, 'flushes': 0,
+                      'rows_written': 0, 'last_flush': None}
+call_stats_flush_lock = threading.Lock()
+
+def normalize_call_stats(data, user_id=None):
+    """Keep only the known call_stats fields; None if the sample has no call_id.
+
+    user_id is the user joined on the sending socket (0 when nobody joined);
+    a user_id in the payload is ignored.
+    """
+    if not isinstance(data, dict) or not data.get('call_id'):
+        return None
+    sample = {'call_id': str(data['call_id'])[:64], 'user_id': user_id if user_id is not None else 0,
+              'candidate_type': None}
+    if data.get('candidate_type') in CANDIDATE_TYPES:
+        sample['candidate_type'] = data['candidate_type']
+    for metric in CALL_STATS_METRICS:
+        value = data.get(metric)
+        if isinstance(value, (int, float)) and not isinstance(value, bool) \
+                and math.isfinite(value) and value >= 0:
+            sample[metric] = float(value)
+    return sample
+
+def enqueue_call_stats(data, user_id=None):
+    """Queue one call_stats sample from user_id for the next flush; False if it was rejected"""
+    sample = normalize_call_stats(data, user_id)
+    if sample is None:
+        return False
+    call_stats_metrics['received'] += 1
+    if len(call_stats_queue) >= app.config['CALL_STATS_QUEUE_MAX']:
+        call_stats_metrics['dropped'] += 1
+        return False
+    call_stats_queue.append((time.time(), sample))
+    return True
+
+def new_histograms():
+    return {metric: {'bins': [0] * (len(edges) + 1), 'count': 0, 'sum': 0.0, 'max': 0.0}
+            for metric, edges in CALL_STATS_METRICS.items()}
+
+def add_call_sample(rollup, sample):
+    """Count one normalized sample into a rollup dict (see call_stats_rollup)"""
+    rollup['samples'] += 1
+    if sample['candidate_type']:
+        rollup['candidate_type'] = sample['candidate_type']
+        if sample['candidate_type'] == 'relay':
+            rollup['relay_samples'] += 1
+    for metric, edges in CALL_STATS_METRICS.items():
+        if metric in sample:
+            value = sample[metric]
+            histogram = rollup['histograms'][metric]
+            histogram['bins'][bisect.bisect_left(edges, value)] += 1
+            histogram['count'] += 1
+            histogram['sum'] += value
+            histogram['max'] = max(histogram['max'], value)
+
+def merge_histograms(into, other):
+    for metric, histogram in other.items():
+        target = into[metric]
+        target['bins'] = [a + b for a, b in zip(target['bins'], histogram['bins'])]
+        target['count'] += histogram['count']
+        target['sum'] += histogram['sum']
+        target['max'] = max(target['max'], histogram['max'])
+
+def histogram_percentile(histogram, edges, pct):
+    """Upper edge of the bin holding the pct-th percentile (the max for the overflow bin)"""
+    if not histogram['count']:
+        return None
+    rank = pct / 100 * histogram['count']
+    seen = 0
+    for i, count in enumerate(histogram['bins']):
+        seen += count
+        if count and seen >= rank:
+            return min(edges[i], histogram['max']) if i < len(edges) else histogram['max']
+    return histogram['max']
+
+def summarize_histograms(histograms):
+    summary = {}
+    for metric, edges in CALL_STATS_METRICS.items():
+        histogram = histograms[metric]
+        count = histogram['count']
+        summary[metric] = {
+            'count': count,
+            'mean': round(histogram['sum'] / count, 2) if count else None,
+            'p50': histogram_percentile(histogram, edges, 50),
+            'p95': histogram_percentile(histogram, edges, 95),
+            'p99': histogram_percentile(histogram, edges, 99),
+            'max': histogram['max'] if count else None,
+        }
+    return summary
+
+def flush_call_stats():
+    """Fold queued samples into call_stats_rollup in one transaction.
+
+    Samples are grouped in memory first, so each flush touches one row per
+    (bucket, call, user) however many samples arrived. The transaction takes
+    the write lock (BEGIN IMMEDIATE) before reading the rows it merges into, so
+    flushes from several workers cannot overwrite each other's merge.
+    Returns samples written.
+    """
+    with call_stats_flush_lock:
+        batch = []
+        while call_stats_queue:
+            batch.append(call_stats_queue.popleft())
+        if not batch:
+            return 0
+        
+        bucket_seconds = app.config['CALL_STATS_BUCKET_SECONDS']
+        rollups = {}
+        for received_at, sample in batch:
+            key = (int(received_at // bucket_seconds) * bucket_seconds, sample['call_id'], sample['user_id'])
+            rollup = rollups.get(key)
+            if rollup is None:
+                rollup = rollups[key] = {'samples': 0, 'relay_samples': 0, 'candidate_type': None,
+                                         'histograms': new_histograms()}
+            add_call_sample(rollup, sample)
+        
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False, timeout=30,
+                               isolation_level=None)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            for key, rollup in rollups.items():
+                cursor.execute('''
+                    SELECT samples, relay_samples, candidate_type, histograms FROM call_stats_rollup
+                    WHERE bucket_start = ? AND call_id = ? AND user_id = ?
+                ''', key)
+                existing = cursor.fetchone()
+                if existing:
+                    rollup['samples'] += existing[0]
+                    rollup['relay_samples'] += existing[1]
+                    rollup['candidate_type'] = rollup['candidate_type'] or existing[2]
+                    merge_histograms(rollup['histograms'], json.loads(existing[3]))
+                cursor.execute('''
+                    INSERT OR REPLACE INTO call_stats_rollup
+                        (bucket_start, call_id, user_id, samples, relay_samples, candidate_type, histograms)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', key + (rollup['samples'], rollup['relay_samples'], rollup['candidate_type'],
+                            json.dumps(rollup['histograms'], separators=(',', ':'))))
+            
+            retention_days = app.config['CALL_STATS_RETENTION_DAYS']
+            if retention_days > 0:
+                cursor.execute('DELETE FROM call_stats_rollup WHERE bucket_start < ?',
+                               (int(time.time()) - retention_days * 86400,))
+            cursor.execute('COMMIT')
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            # Put the batch back so the next flush retries it
+            call_stats_queue.extendleft(reversed(batch))
+            raise
+        finally:
+            conn.close()
+        
+        call_stats_metrics['flushed'] += len(batch)
+        call_stats_metrics['flushes'] += 1
+        call_stats_metrics['rows_written'] += len(rollups)
+        call_stats_metrics['last_flush'] = datetime.now().isoformat()
+        return len(batch)
+
+def call_stats_loop():
+    while True:
+        socketio.sleep(app.config['CALL_STATS_FLUSH_INTERVAL'])
+        try:
+            flush_call_stats()
+        except Exception as e:
+            print(f"❌ Call stats flush error: {str(e)}")
+
+def start_call_stats_job():
+    """Start the call_stats flusher in the background (once per process)"""
+    if app.config['CALL_STATS_FLUSH_INTERVAL'] <= 0:
+        return False
+    if not start_background_job('call_stats', call_stats_loop):
+        return False
+    print(f"📶 Call stats: flushing every {app.config['CALL_STATS_FLUSH_INTERVAL']}s "
+          f"into {app.config['CALL_STATS_BUCKET_SECONDS']}s buckets")
+    return True
+
+# id -> username, extended with users registered since the last lookup
+usernames = {}
+usernames_lock = threading.Lock()
+
+def cached_usernames():
+    """Users map for resolving names without joining users on every message row"""
+    with usernames_lock:
+        last_id = max(usernames, default=0)
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+        try:
+            usernames.update(conn.execute('SELECT id, username FROM users WHERE id > ?', (last_id,)))
+        finally:
+            conn.close()
+        return usernames
+
+daily_stats_lock = threading.Lock()
+
+def upload_size(file_path):
+    try:
+        return os.path.getsize(os.path.join(app.config['UPLOAD_FOLDER'], os.path.basename(file_path)))
+    except OSError:
+        return 0
+
+def fold_daily_stats(conn, table, state_name, batch_size):
+    """Count rows of table past the position saved as state_name into daily_user_stats.
+
+    conn must be in autocommit mode (isolation_level=None): each batch is its
+    own BEGIN IMMEDIATE transaction and reads the position under the write
+    lock, so workers folding at the same time never count a batch twice.
+    """
+    processed = 0
+    while True:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            processed_batch = fold_daily_stats_batch(conn, table, state_name, batch_size)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        processed += processed_batch
+        if processed_batch < batch_size:
+            return processed
+        socketio.sleep(0)
+
+def fold_daily_stats_batch(conn, table, state_name, batch_size):
+    """One batch of fold_daily_stats, inside the caller's transaction; returns rows counted"""
+    row = conn.execute('SELECT value FROM analytics_state WHERE name = ?', (state_name,)).fetchone()
+    rows = conn.execute(f'''
+        SELECT id, sender_id, receiver_id, file_path, created_at FROM {table}
+        WHERE id > ? ORDER BY id LIMIT ?
+    ''', (row[0] if row else 0, batch_size)).fetchall()
+    if not rows:
+        return 0
+    
+    counts = {}  # (day, user_id) -> [sent, received, uploads, upload_bytes]
+    for _, sender_id, receiver_id, file_path, created_at in rows:
+        day = str(created_at)[:10]
+        sent = counts.setdefault((day, sender_id), [0, 0, 0, 0])
+        sent[0] += 1
+        if file_path:
+            sent[2] += 1
+            sent[3] += upload_size(file_path)
+        counts.setdefault((day, receiver_id), [0, 0, 0, 0])[1] += 1
+    
+    conn.executemany('''
+        INSERT INTO daily_user_stats
+            (day, user_id, messages_sent, messages_received, uploads, upload_bytes)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, day) DO UPDATE SET
+            messages_sent = messages_sent + excluded.messages_sent,
+            messages_received = messages_received + excluded.messages_received,
+            uploads = uploads + excluded.uploads,
+            upload_bytes = upload_bytes + excluded.upload_bytes
+    ''', [key + tuple(c) for key, c in counts.items()])
+    conn.execute('INSERT OR REPLACE INTO analytics_state (name, value) VALUES (?, ?)',
+                 (state_name, rows[-1][0]))
+    return len(rows)
+
+def update_daily_stats(batch_size=None):
+    """Fold messages added since the last run into daily_user_stats.
+
+    Reads forward from the last counted message id (a primary key range), and
+    commits the counters together with the new position, so every message is
+    counted exactly once, also with several workers running this at once (see
+    fold_daily_stats). The first run also backfills the monthly archives,
+    each with its own saved position so an interrupted backfill resumes.
+    Returns the number of messages processed.
+    """
+    batch_size = batch_size or app.config['ANALYTICS_BATCH_SIZE']
+    processed = 0
+    with daily_stats_lock:
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False, timeout=30,
+                               isolation_level=None)
+        try:
+            if not conn.execute("SELECT 1 FROM analytics_state WHERE name = 'daily_stats_last_id'").fetchone():
+                for month in reversed(list_archive_months()):
+                    conn.execute('ATTACH DATABASE ? AS archive', (archive_path(month),))
+                    try:
+                        processed += fold_daily_stats(conn, 'archive.messages',
+                                                      f'daily_stats_archive_{month}', batch_size)
+                    finally:
+                        conn.execute('DETACH DATABASE archive')
+            processed += fold_daily_stats(conn, 'main.messages', 'daily_stats_last_id', batch_size)
+        finally:
+            conn.close()
+    return processed
+
+def analytics_loop():
+    while True:
+        try:
+            processed = update_daily_stats()
+            if processed:
+                print(f"📊 Daily stats: counted {processed} new messages")
+        except Exception as e:
+            print(f"❌ Daily stats error: {str(e)}")
+        socketio.sleep(app.config['ANALYTICS_INTERVAL'])
+
+def start_analytics_job():
+    """Start the incremental daily stats job in the background (once per process)"""
+    if app.config['ANALYTICS_INTERVAL'] <= 0:
+        return False
+    if not start_background_job('analytics', analytics_loop):
+        return False
+    print(f"📊 Daily stats job: every {app.config['ANALYTICS_INTERVAL']}s")
+    return True
+
+# job id -> status dict for jobs started by this process; only the most recent
+# jobs are kept. Every status change is also written to a JSON file next to the
+# export, which is what other workers read.
+export_jobs = {}
+export_jobs_lock = threading.Lock()
+
+def export_status_path(job_id):
+    return os.path.join(app.config['EXPORT_DIR'], f'messages_{job_id}.json')
+
+def save_export_status(job):
+    """Write the job's status file atomically so any worker can serve it"""
+    status_path = export_status_path(job['id'])
+    tmp_path = f'{status_path}.tmp-{os.getpid()}'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(job, f)
+    os.replace(tmp_path, status_path)
+
+def find_export_job(job_id):
+    """The job with job_id, started by this or another worker; None if unknown"""
+    if not re.fullmatch(r'[0-9a-f]{32}', job_id):
+        return None
+    job = export_jobs.get(job_id)
+    if job is not None:
+        return job
+    try:
+        with open(export_status_path(job_id), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+EXPORT_FORMATS = {'ndjson': 'ndjson', 'csv': 'csv'}
+
+def iter_export_chunks(conn, table, after_id, user_id=None, since=None, until=None, chunk_size=1000):
+    """Yield lists of message rows from table in id order, one keyset page per chunk"""
+    conditions = ['id > ?']
+    params = []
+    if user_id is not None:
+        conditions.append('(sender_id = ? OR receiver_id = ?)')
+        params += [user_id, user_id]
+    if since:
+        conditions.append('created_at >= ?')
+        params.append(since)
+    if until:
+        conditions.append('created_at < ?')
+        params.append(until)
+    while True:
+        rows = conn.execute(f'''
+            SELECT {MESSAGE_COLUMNS} FROM {table}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY id LIMIT ?
+        ''', [after_id] + params + [chunk_size]).fetchall()
+        if not rows:
+            return
+        yield rows
+        after_id = rows[-1][0]
+        if len(rows) < chunk_size:
+            return
+
+def format_export_rows(rows, fmt, names):
+    out = io.StringIO()
+    writer = csv.writer(out) if fmt == 'csv' else None
+    for msg_id, sender_id, receiver_id, content, message_type, file_path, created_at in rows:
+        sender = names.get(sender_id, f'User {sender_id}')
+        receiver = names.get(receiver_id, f'User {receiver_id}')
+        if writer:
+            writer.writerow([msg_id, sender_id, sender, receiver_id, receiver,
+                             content, message_type, file_path, created_at])
+        else:
+            out.write(json.dumps({
+                'id': msg_id, 'sender_id': sender_id, 'sender': sender,
+                'receiver_id': receiver_id, 'receiver': receiver, 'content': content,
+                'message_type': message_type, 'file_path': file_path, 'created_at': created_at
+            }, ensure_ascii=False) + '\n')
+    return out.getvalue()
+
+def run_export(job):
+    """Stream the job's messages, archives first, to its file in chunks"""
+    job['status'] = 'running'
+    save_export_status(job)
+    part_path = job['path'] + '.part'
+    db_uri = f'file:{pathname2url(os.path.abspath(DATABASE_PATH))}?mode=ro'
+    conn = sqlite3.connect(db_uri, uri=True, check_same_thread=False)
+    try:
+        names = cached_usernames()
+        sources = [(archive_path(month), 'archive.messages') for month in reversed(list_archive_months())]
+        sources.append((None, 'main.messages'))
+        with open(part_path, 'w', newline='', encoding='utf-8') as f:
+            if job['format'] == 'csv':
+                csv.writer(f).writerow(['id', 'sender_id', 'sender', 'receiver_id', 'receiver',
+                                        'content', 'message_type', 'file_path', 'created_at'])
+            # The live table resumes after the newest archived id, which skips
+            # rows an interrupted archive batch left in both places
+            archived_max_id = 0
+            for path, table in sources:
+                after_id = 0 if path else archived_max_id
+                if path:
+                    conn.execute('ATTACH DATABASE ? AS archive',
+                                 (f'file:{pathname2url(os.path.abspath(path))}?mode=ro',))
+                try:
+                    for rows in iter_export_chunks(conn, table, after_id, job['user_id'], job['since'],
+                                                   job['until'], app.config['EXPORT_CHUNK_SIZE']):
+                        if any(r[1] not in names or r[2] not in names for r in rows):
+                            names = cached_usernames()
+                        f.write(format_export_rows(rows, job['format'], names))
+                        if path:
+                            archived_max_id = max(archived_max_id, rows[-1][0])
+                        job['rows'] += len(rows)
+                        save_export_status(job)
+                        socketio.sleep(0)
+                finally:
+                    if path:
+                        conn.execute('DETACH DATABASE archive')
+        os.replace(part_path, job['path'])
+        job['bytes'] = os.path.getsize(job['path'])
+        job['status'] = 'done'
+        print(f"📦 Export {job['id']}: {job['rows']} messages, {job['bytes']:,} bytes")
+    except Exception as e:
+        job['status'] = 'failed'
+        job['error'] = str(e)
+        print(f"❌ Export {job['id']} error: {str(e)}")
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    finally:
+        conn.close()
+        job['finished_at'] = datetime.now().isoformat()
+        save_export_status(job)
+
+def new_export_job(user_id=None, fmt='ndjson', since=None, until=None):
+    """Register an export job (run it with run_export); returns the job dict"""
+    export_dir = app.config['EXPORT_DIR']
+    os.makedirs(export_dir, exist_ok=True)
+    
+    # Drop expired export files
+    cutoff = time.time() - app.config['EXPORT_TTL']
+    with os.scandir(export_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+    
+    job_id = uuid.uuid4().hex
+    job = {'id': job_id, 'status': 'queued', 'format': fmt, 'user_id': user_id,
+           'since': since, 'until': until, 'rows': 0, 'bytes': 0, 'error': None,
+           'path': os.path.join(export_dir, f'messages_{job_id}.{EXPORT_FORMATS[fmt]}'),
+           'started_at': datetime.now().isoformat(), 'finished_at': None}
+    with export_jobs_lock:
+        for old_id in list(export_jobs)[:-99]:
+            if export_jobs[old_id]['status'] in ('done', 'failed'):
+                del export_jobs[old_id]
+        export_jobs[job_id] = job
+    save_export_status(job)
+    return job
+
+def start_export(user_id=None, fmt='ndjson', since=None, until=None):
+    """Queue an export job and run it in the background; returns the job dict"""
+    job = new_export_job(user_id, fmt, since, until)
+    socketio.start_background_task(run_export, job)
+    return job
+
+@app.cli.command('export')
+@click.option('--user-id', type=int, help="only this user's messages (default: all)")
+@click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default='ndjson')
+@click.option('--since', help='created_at lower bound, e.g. 2025-01-01')
+@click.option('--until', help='created_at upper bound (exclusive)')
+def export_command(user_id, fmt, since, until):
+    """Export messages to EXPORT_DIR without going through the HTTP API"""
+    job = new_export_job(user_id, fmt, since, until)
+    run_export(job)
+    if job['status'] != 'done':
+        print(f"❌ Export failed: {job['error']}")
+        raise SystemExit(1)
+    print(f"✅ Exported {job['rows']} messages ({job['bytes']:,} bytes) to {job['path']}")
+
 def init_db():
     """Initialize database tables"""
+    os.makedirs(os.path.dirname(os.path.abspath(DATABASE_PATH)), exist_ok=True)
+    restore_db_from_backup()
     return ensure_db_exists()
 
-# Initialize database on startup
-print("🔍 Initializing database...")
-init_db()
-print("✅ Database ready")
+_app_initialized = False
+_app_init_lock = threading.Lock()
+
+def create_app():
+    """Prepare directories, database and background jobs, then return the app.
+
+    Importing this module does no filesystem or database work; every server
+    entry point calls this once per process instead: gunicorn through
+    'source.server.app:create_app()', asgi_app.py on ASGI startup, and
+    __main__ below. Repeated calls return the same app.
+    """
+    global _app_initialized
+    with _app_init_lock:
+        if _app_initialized:
+            return app
+        
+        # Ensure upload directory exists
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        
+        # Debug paths
+        print(f"🔍 Project root: {project_root}")
+        print(f"📁 Template directory: {template_dir}")
+        print(f"📂 Upload directory: {app.config['UPLOAD_FOLDER']}")
+        
+        # Initialize database on startup
+        print(f"🔍 Initializing database: {DATABASE_PATH}")
+        if not init_db():
+            raise RuntimeError(f"Database initialization failed: {DATABASE_PATH}")
+        start_backup_job()
+        start_archive_job()
+        start_upload_gc_job()
+        start_call_stats_job()
+        start_analytics_job()
+        print("✅ Database ready")
+        
+        _app_initialized = True
+        return app
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create or migrate the database schema (run once per deployment)"""
+    if not init_db():
+        raise SystemExit(1)
+    print(f"✅ Database schema v{SCHEMA_VERSION}: {DATABASE_PATH}")
 
 # Sửa tất cả sqlite3.connect thành:
 # conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
@@ -100,6 +1236,282 @@ def verify_password(password, password_hash):
 connected_users = {}
 user_last_seen = {}
 
+class RateLimiter:
+    """Token buckets keyed by connection (sid or client address) and event name.
+
+    Each check is O(1): the bucket is refilled lazily from the time elapsed since
+    the previous event instead of by a background timer.
+    """
+
+    # Seconds between sweeps for buckets of keys that went idle
+    SWEEP_INTERVAL = 60
+
+    def __init__(self, limits):
+        self.limits = limits
+        self.buckets = {}  # key -> {event: [tokens, last_refill]}
+        self.metrics = {}  # event -> {'allowed': n, 'delayed': n, 'dropped': n}
+        self.lock = threading.Lock()
+        self.last_sweep = time.monotonic()
+
+    def acquire(self, key, event):
+        """Take a token for event. Returns seconds to wait first, or None to drop."""
+        limit = self.limits.get(event)
+        if not limit:
+            return 0.0
+
+        rate = float(limit.get('rate', 1))
+        burst = float(limit.get('burst', rate))
+        now = time.monotonic()
+
+        with self.lock:
+            if now - self.last_sweep >= self.SWEEP_INTERVAL:
+                self.sweep(now)
+            bucket = self.buckets.setdefault(key, {}).get(event)
+            if bucket is None:
+                bucket = self.buckets[key][event] = [burst, now]
+
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+
+            counters = self.metrics.setdefault(event, {'allowed': 0, 'delayed': 0, 'dropped': 0})
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                counters['allowed'] += 1
+                return 0.0
+
+            # Queue policy: borrow the token now and wait until it has been refilled
+            wait = (1 - bucket[0]) / rate if rate > 0 else None
+            if limit.get('policy') == 'queue' and wait is not None and wait <= limit.get('max_delay', 1):
+                bucket[0] -= 1
+                counters['delayed'] += 1
+                return wait
+
+            counters['dropped'] += 1
+            return None
+
+    def sweep(self, now):
+        """Remove buckets that have refilled completely; a new bucket starts full anyway.
+
+        HTTP clients are keyed by address and never disconnect, so without this
+        their buckets would accumulate forever. Called with the lock held.
+        """
+        self.last_sweep = now
+        for key in list(self.buckets):
+            events = self.buckets[key]
+            for event, (tokens, last_refill) in list(events.items()):
+                limit = self.limits.get(event) or {}
+                rate = float(limit.get('rate', 1))
+                burst = float(limit.get('burst', rate))
+                if rate > 0 and tokens + (now - last_refill) * rate >= burst:
+                    del events[event]
+            if not events:
+                del self.buckets[key]
+
+    def forget(self, key):
+        """Drop all buckets of a disconnected client"""
+        with self.lock:
+            self.buckets.pop(key, None)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'limits': self.limits,
+                'active_keys': len(self.buckets),
+                'events': {event: dict(c) for event, c in self.metrics.items()},
+            }
+
+rate_limiter = RateLimiter(app.config['RATE_LIMITS'])
+
+def rate_limited(event):
+    """Apply the RATE_LIMITS budget of event to a Socket.IO handler or HTTP route"""
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            sid = getattr(request, 'sid', None)
+            wait = rate_limiter.acquire(sid or request.remote_addr, event)
+
+            if wait is None:
+                if sid is None:
+                    response = jsonify({'error': 'Too many requests, please slow down'})
+                    response.headers['Retry-After'] = '1'
+                    return response, 429
+                if rate_limiter.limits[event].get('notify'):
+                    data = args[0] if args and isinstance(args[0], dict) else {}
+                    emit('error', {
+                        'message': 'Rate limit exceeded, please slow down',
+                        'event': event,
+                        'client_message_id': data.get('client_message_id')
+                    })
+                return None
+
+            if wait:
+                socketio.sleep(wait)
+            return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# user id -> ICE config with TURN credentials, until TURN_REFRESH_MARGIN before
+# expiry; least recently used entries are evicted past ICE_CONFIG_CACHE_SIZE
+ICE_CONFIG_CACHE_SIZE = 10000
+ice_config_cache = collections.OrderedDict()
+ice_config_lock = threading.Lock()
+
+def turn_credential(username, secret):
+    """TURN REST API password for username: base64(HMAC-SHA1(secret, username))"""
+    digest = hmac.new(secret.encode(), username.encode(), hashlib.sha1).digest()
+    return base64.b64encode(digest).decode()
+
+def verify_turn_credential(username, credential, secret=None, now=None):
+    """Check credentials the way a TURN server with use-auth-secret does"""
+    secret = secret or app.config['TURN_SECRET']
+    try:
+        expires_at = int(username.split(':', 1)[0])
+    except ValueError:
+        return False
+    if expires_at <= (now or time.time()):
+        return False
+    return hmac.compare_digest(turn_credential(username, secret), credential)
+
+def ice_servers_for(user_id, now=None):
+    """RTCPeerConnection config for user_id: {'iceServers': [...], 'expires_at': ts or None}
+
+    Without a user_id (nobody joined) only the STUN servers are returned.
+    """
+    now = now or time.time()
+    stun = [{'urls': app.config['STUN_URLS']}] if app.config['STUN_URLS'] else []
+    if user_id is None or not (app.config['TURN_URLS'] and app.config['TURN_SECRET']):
+        return {'iceServers': stun, 'expires_at': None}
+    
+    key = str(user_id)
+    with ice_config_lock:
+        cached = ice_config_cache.get(key)
+        if cached and cached['expires_at'] - app.config['TURN_REFRESH_MARGIN'] > now:
+            ice_config_cache.move_to_end(key)
+            return cached
+    
+    expires_at = int(now) + app.config['TURN_TTL']
+    username = f'{expires_at}:{key}'
+    config = {
+        'iceServers': stun + [{
+            'urls': app.config['TURN_URLS'],
+            'username': username,
+            'credential': turn_credential(username, app.config['TURN_SECRET']),
+        }],
+        'expires_at': expires_at,
+    }
+    with ice_config_lock:
+        ice_config_cache[key] = config
+        ice_config_cache.move_to_end(key)
+        while len(ice_config_cache) > ICE_CONFIG_CACHE_SIZE:
+            ice_config_cache.popitem(last=False)
+    return config
+
+def joined_user_id(sid, user_id=None):
+    """The user that joined on socket sid (and is user_id, when given), else None"""
+    if user_id is not None:
+        return user_id if connected_users.get(user_id) == sid else None
+    for joined_id, joined_sid in list(connected_users.items()):
+        if joined_sid == sid:
+            return joined_id
+    return None
+
+@app.cli.command('ice-servers')
+@click.option('--user-id', default='0', help='user the TURN credentials are issued for')
+def ice_servers_command(user_id):
+    """Print the ICE config a client would get, e.g. to test a local TURN server"""
+    config = ice_servers_for(user_id)
+    print(json.dumps(config, indent=2))
+    for server in config['iceServers']:
+        if 'credential' in server:
+            print(f"turnutils_uclient -u '{server['username']}' -w '{server['credential']}' <turn host>")
+
+# Bodies smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = 512
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+# cache key -> entry built by build_cached_entry(); client_assets maps each
+# source/client file name to its hashed name, hashed_assets the reverse
+page_cache = {}
+client_assets = {}
+hashed_assets = {}
+page_cache_lock = threading.Lock()
+
+def build_cached_entry(body, content_type, compress=True):
+    """Body, ETag and precomputed compressed variants of one response"""
+    entry = {'body': body, 'content_type': content_type,
+             'etag': hashlib.sha256(body).hexdigest()[:20], 'gzip': None, 'br': None}
+    if compress and len(body) >= COMPRESS_MIN_BYTES and content_type.startswith(COMPRESSIBLE_TYPES):
+        compressed = gzip.compress(body, 9, mtime=0)
+        if len(compressed) < len(body):
+            entry['gzip'] = compressed
+        if brotli is not None:
+            compressed = brotli.compress(body, quality=11)
+            if len(compressed) < len(body):
+                entry['br'] = compressed
+    return entry
+
+def load_client_assets():
+    """Read source/client into memory once (every time with PAGE_CACHE off)"""
+    with page_cache_lock:
+        if client_assets and app.config['PAGE_CACHE']:
+            return client_assets
+        client_assets.clear()
+        hashed_assets.clear()
+        for name in sorted(os.listdir(client_dir)):
+            path = os.path.join(client_dir, name)
+            if not os.path.isfile(path):
+                continue
+            with open(path, 'rb') as f:
+                body = f.read()
+            content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            if content_type.startswith('text/') or content_type == 'application/javascript':
+                content_type += '; charset=utf-8'
+            entry = build_cached_entry(body, content_type, compress=app.config['PAGE_CACHE'])
+            root, ext = os.path.splitext(name)
+            hashed_name = f"{root}.{entry['etag'][:12]}{ext}"
+            client_assets[name] = hashed_name
+            hashed_assets[hashed_name] = entry
+        return client_assets
+
+def asset_url(name):
+    """Content-hashed URL of a source/client file, for templates"""
+    return f'/assets/{load_client_assets()[name]}'
+
+app.jinja_env.globals['asset_url'] = asset_url
+
+def cached_page(template, **context):
+    """Render a template once per context and keep the result in page_cache"""
+    key = (template,) + tuple(sorted(context.items()))
+    entry = page_cache.get(key)
+    if entry is None or not app.config['PAGE_CACHE']:
+        html = render_template(template, **context).encode()
+        entry = build_cached_entry(html, 'text/html; charset=utf-8', compress=app.config['PAGE_CACHE'])
+        with page_cache_lock:
+            page_cache[key] = entry
+    return entry
+
+def cached_response(entry, cache_control):
+    """Serve a cache entry: 304 on a matching ETag, else the best encoding the client accepts"""
+    variants = [('br', entry['br'], '-br'), ('gzip', entry['gzip'], '-gz'), (None, entry['body'], '')]
+    etags = [entry['etag'] + suffix for _, body, suffix in variants if body is not None]
+    
+    matched = next((etag for etag in etags if request.if_none_match.contains_weak(etag)), None)
+    if matched:
+        response = app.response_class(status=304)
+        response.set_etag(matched)
+    else:
+        for encoding, body, suffix in variants:
+            if body is not None and (encoding is None or request.accept_encodings[encoding]):
+                break
+        response = app.response_class(body, content_type=entry['content_type'])
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.set_etag(entry['etag'] + suffix)
+    response.headers['Cache-Control'] = cache_control
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
 # EMERGENCY TEST ROUTE
 @app.route('/working')
 def working():
@@ -108,24 +1520,31 @@ def working():
 @app.route('/')
 def index():
     try:
-        return render_template('index.html')
+        return cached_response(cached_page('index.html'), 'no-cache')
     except Exception as e:
         return f"<h1>Template Error:</h1><p>{str(e)}</p><p>Template dir: {app.template_folder}</p>"
 
 @app.route('/chat')
 def chat():
     try:
-        return render_template('chat.html')
+        entry = cached_page('chat.html', socketio_serializer=app.config['SOCKETIO_SERIALIZER'])
+        return cached_response(entry, 'no-cache')
     except Exception as e:
         return f"<h1>Chat Template Error:</h1><p>{str(e)}</p>"
 
+@app.route('/assets/<path:filename>')
+def client_asset(filename):
+    """source/client files; hashed names are immutable, plain names revalidate"""
+    assets = load_client_assets()
+    if filename in hashed_assets:
+        return cached_response(hashed_assets[filename], f'public, max-age={ASSET_MAX_AGE}, immutable')
+    if filename in assets:
+        return cached_response(hashed_assets[assets[filename]], 'no-cache')
+    return "File not found", 404
+
 @app.route('/api/register', methods=['POST'])
 def register_user():
     try:
-        # Ensure database exists
-        if not ensure_db_exists():
-            return jsonify({'error': 'Database initialization failed'}), 500
-            
         data = request.get_json()
         if not data:
             return jsonify({'error': 'No JSON data provided'}), 400
@@ -164,10 +1583,6 @@ def register_user():
 @app.route('/api/login', methods=['POST'])
 def login_user():
     try:
-        # Ensure database exists
-        if not ensure_db_exists():
-            return jsonify({'error': 'Database initialization failed'}), 500
-            
         data = request.get_json()
         if not data:
             return jsonify({'error': 'No JSON data provided'}), 400
@@ -203,10 +1618,6 @@ def login_user():
 @app.route('/api/users')
 def get_users():
     try:
-        # Ensure database exists
-        if not ensure_db_exists():
-            return jsonify({'error': 'Database initialization failed'}), 500
-            
         conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
         cursor = conn.cursor()
         cursor.execute('SELECT id, username FROM users')
@@ -231,27 +1642,64 @@ def get_users():
         print(f"❌ Get users error: {str(e)}")
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
+def query_conversation(cursor, table, user1_id, user2_id, before_id, limit):
+    """Newest-first page of a conversation from the live table or an attached archive"""
+    cursor.execute(f'''
+        SELECT m.id, m.sender_id, m.receiver_id, m.content, m.message_type, 
+               m.file_path, m.created_at, u.username
+        FROM {table} m
+        JOIN main.users u ON m.sender_id = u.id
+        WHERE ((m.sender_id = ? AND m.receiver_id = ?) 
+            OR (m.sender_id = ? AND m.receiver_id = ?))
+          AND m.id < ?
+        ORDER BY m.id DESC
+        LIMIT ?
+    ''', (user1_id, user2_id, user2_id, user1_id, before_id, limit))
+    return cursor.fetchall()
+
 @app.route('/api/messages/<int:user1_id>/<int:user2_id>')
 def get_messages(user1_id, user2_id):
+    """Conversation history, oldest first.
+
+    Without parameters returns everything still in the live table. With
+    ?limit=N (and ?before=<message id> when scrolling back) returns the N
+    messages preceding before, reading through to the monthly archives once the
+    live table runs out.
+    """
     try:
-        # Ensure database exists
-        if not ensure_db_exists():
-            return jsonify({'error': 'Database initialization failed'}), 500
-            
+        limit = request.args.get('limit', type=int)
+        before_id = request.args.get('before', type=int) or sys.maxsize
+        
         conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT m.id, m.sender_id, m.receiver_id, m.content, m.message_type, 
-                   m.file_path, m.created_at, u.username
-            FROM messages m
-            JOIN users u ON m.sender_id = u.id
-            WHERE (m.sender_id = ? AND m.receiver_id = ?) 
-               OR (m.sender_id = ? AND m.receiver_id = ?)
-            ORDER BY m.created_at ASC
-        ''', (user1_id, user2_id, user2_id, user1_id))
+        
+        if limit is None:
+            cursor.execute('''
+                SELECT m.id, m.sender_id, m.receiver_id, m.content, m.message_type, 
+                       m.file_path, m.created_at, u.username
+                FROM messages m
+                JOIN users u ON m.sender_id = u.id
+                WHERE (m.sender_id = ? AND m.receiver_id = ?) 
+                   OR (m.sender_id = ? AND m.receiver_id = ?)
+                ORDER BY m.created_at ASC
+            ''', (user1_id, user2_id, user2_id, user1_id))
+            rows = cursor.fetchall()
+        else:
+            limit = max(1, min(limit, 500))
+            rows = query_conversation(cursor, 'main.messages', user1_id, user2_id, before_id, limit)
+            for month in list_archive_months():
+                if len(rows) >= limit:
+                    break
+                cursor.execute('ATTACH DATABASE ? AS archive', (archive_path(month),))
+                try:
+                    rows += query_conversation(cursor, 'archive.messages', user1_id, user2_id,
+                                               rows[-1][0] if rows else before_id, limit - len(rows))
+                finally:
+                    cursor.execute('DETACH DATABASE archive')
+            rows.reverse()
         
         messages = []
-        for row in cursor.fetchall():
+        for row in rows:
             messages.append({
                 'id': row[0],
                 'sender_id': row[1],
@@ -269,7 +1717,244 @@ def get_messages(user1_id, user2_id):
         print(f"❌ Get messages error: {str(e)}")
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
+@app.route('/api/rate_limits')
+def get_rate_limits():
+    return jsonify(rate_limiter.snapshot())
+
+@app.route('/api/uploads/stats')
+def get_upload_stats():
+    with upload_usage_lock:
+        usage = {str(key): used for key, used in upload_usage.items() if not is_address_key(key)}
+        anonymous = sum(used for key, used in upload_usage.items() if is_address_key(key))
+    return jsonify({'last_sweep': last_upload_sweep, 'usage_bytes': usage,
+                    'anonymous_usage_bytes': anonymous,
+                    'usage_complete': upload_usage_ready,
+                    'quota_bytes': app.config['UPLOAD_QUOTA_BYTES']})
+
+@app.route('/api/ice_servers')
+@rate_limited('ice_servers')
+def get_ice_servers():
+    # Anonymous: STUN only. TURN credentials come from the get_ice_servers event
+    # of a socket the user has joined on.
+    response = jsonify(ice_servers_for(None))
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/api/call_stats')
+def get_call_stats():
+    """Call quality percentiles from the rollups.
+
+    ?hours=24 limits the time range, ?call_id= selects one call, ?limit=50 caps
+    the per-call list (most recent calls first) and ?interval=3600 sets the
+    width in seconds of the time series used to spot regressions.
+    """
+    try:
+        hours = request.args.get('hours', 24, type=float)
+        call_id = request.args.get('call_id')
+        limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+        interval = max(app.config['CALL_STATS_BUCKET_SECONDS'], request.args.get('interval', 3600, type=int))
+        since = int(time.time() - hours * 3600)
+        
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+        try:
+            query = '''
+                SELECT bucket_start, call_id, user_id, samples, relay_samples, candidate_type, histograms
+                FROM call_stats_rollup WHERE bucket_start >= ?
+            '''
+            params = [since]
+            if call_id:
+                query += ' AND call_id = ?'
+                params.append(call_id)
+            rows = conn.execute(query + ' ORDER BY bucket_start', params).fetchall()
+        finally:
+            conn.close()
+        
+        overall = new_histograms()
+        calls = {}
+        series = {}
+        for bucket_start, row_call_id, user_id, samples, relay_samples, candidate_type, histograms in rows:
+            histograms = json.loads(histograms)
+            merge_histograms(overall, histograms)
+            
+            call = calls.get(row_call_id)
+            if call is None:
+                call = calls[row_call_id] = {'call_id': row_call_id, 'users': set(), 'samples': 0,
+                                             'relay_samples': 0, 'candidate_type': None,
+                                             'first_bucket': bucket_start, 'histograms': new_histograms()}
+            call['users'].add(user_id)
+            call['samples'] += samples
+            call['relay_samples'] += relay_samples
+            call['candidate_type'] = candidate_type or call['candidate_type']
+            call['last_bucket'] = bucket_start
+            merge_histograms(call['histograms'], histograms)
+            
+            point = series.get(bucket_start // interval)
+            if point is None:
+                point = series[bucket_start // interval] = {'samples': 0, 'relay_samples': 0,
+                                                            'histograms': new_histograms()}
+            point['samples'] += samples
+            point['relay_samples'] += relay_samples
+            merge_histograms(point['histograms'], histograms)
+        
+        # A call counts as relayed if any side reported a relay candidate pair
+        relayed = sum(1 for c in calls.values() if c['relay_samples'])
+        known = sum(1 for c in calls.values() if c['candidate_type'])
+        recent = sorted(calls.values(), key=lambda c: c['last_bucket'], reverse=True)[:limit]
+        
+        return jsonify({
+            'since': since,
+            'calls_total': len(calls),
+            'aggregate': {
+                'samples': sum(c['samples'] for c in calls.values()),
+                'relay_calls': relayed,
+                'direct_calls': known - relayed,
+                'relay_rate': round(relayed / known, 4) if known else None,
+                'direct_rate': round((known - relayed) / known, 4) if known else None,
+                'metrics': summarize_histograms(overall),
+            },
+            'calls': [{
+                'call_id': c['call_id'],
+                'users': sorted(c['users']),
+                'samples': c['samples'],
+                'candidate_type': c['candidate_type'],
+                'relayed': bool(c['relay_samples']),
+                'first_bucket': c['first_bucket'],
+                'last_bucket': c['last_bucket'],
+                'metrics': summarize_histograms(c['histograms']),
+            } for c in recent],
+            'series': [{
+                'start': key * interval,
+                'samples': point['samples'],
+                'relay_sample_rate': round(point['relay_samples'] / point['samples'], 4),
+                'rtt_ms_p50': histogram_percentile(point['histograms']['rtt_ms'],
+                                                   CALL_STATS_METRICS['rtt_ms'], 50),
+                'packet_loss_p95': histogram_percentile(point['histograms']['packet_loss'],
+                                                        CALL_STATS_METRICS['packet_loss'], 95),
+            } for key, point in sorted(series.items())],
+            'pipeline': dict(call_stats_metrics, queued=len(call_stats_queue)),
+        })
+    except Exception as e:
+        print(f"❌ Call stats error: {str(e)}")
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+def export_token_required(f):
+    """Reject requests without an X-Export-Token header matching EXPORT_TOKEN (exports, analytics)"""
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        token = app.config['EXPORT_TOKEN']
+        if not token:
+            return jsonify({'error': 'Disabled, set EXPORT_TOKEN to enable exports and analytics'}), 403
+        if not hmac.compare_digest(request.headers.get('X-Export-Token', '').encode(), token.encode()):
+            return jsonify({'error': 'Invalid export token'}), 401
+        return f(*args, **kwargs)
+    return wrapper
+
+def export_job_info(job):
+    info = {k: v for k, v in job.items() if k != 'path'}
+    if job['status'] == 'done':
+        info['download_url'] = f"/api/exports/{job['id']}/download"
+    return info
+
+@app.route('/api/exports', methods=['POST'])
+@rate_limited('export')
+@export_token_required
+def create_export():
+    """Start an export of one user's (user_id) or all messages as ndjson or csv"""
+    data = request.get_json(silent=True) or {}
+    fmt = data.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unknown format, use one of {', '.join(EXPORT_FORMATS)}"}), 400
+    user_id = data.get('user_id')
+    if user_id is not None and not isinstance(user_id, int):
+        return jsonify({'error': 'user_id must be an integer'}), 400
+    try:
+        job = start_export(user_id, fmt, data.get('since'), data.get('until'))
+        return jsonify(export_job_info(job)), 202
+    except Exception as e:
+        print(f"❌ Export error: {str(e)}")
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+@app.route('/api/exports/<job_id>')
+@export_token_required
+def get_export(job_id):
+    job = find_export_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Export not found'}), 404
+    return jsonify(export_job_info(job))
+
+@app.route('/api/exports/<job_id>/download')
+@export_token_required
+def download_export(job_id):
+    job = find_export_job(job_id)
+    if job is None or not os.path.exists(job['path']):
+        return jsonify({'error': 'Export not found'}), 404
+    if job['status'] != 'done':
+        return jsonify({'error': f"Export is {job['status']}"}), 409
+    return send_from_directory(app.config['EXPORT_DIR'], os.path.basename(job['path']), as_attachment=True)
+
+@app.route('/api/analytics/daily')
+@export_token_required
+def get_daily_stats():
+    """Daily message/upload counters, optionally for one ?user_id= and a ?since=/?until= day range
+
+    Returns the counters as analytics_loop last left them, with the last
+    message id they include; the request itself never folds messages.
+    """
+    try:
+        user_id = request.args.get('user_id', type=int)
+        conditions = []
+        params = []
+        if user_id is not None:
+            conditions.append('user_id = ?')
+            params.append(user_id)
+        if request.args.get('since'):
+            conditions.append('day >= ?')
+            params.append(request.args['since'])
+        if request.args.get('until'):
+            conditions.append('day < ?')
+            params.append(request.args['until'])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+        try:
+            rows = conn.execute(f'''
+                SELECT day, user_id, messages_sent, messages_received, uploads, upload_bytes
+                FROM daily_user_stats {where} ORDER BY day, user_id
+            ''', params).fetchall()
+            counted = conn.execute(
+                "SELECT value FROM analytics_state WHERE name = 'daily_stats_last_id'").fetchone()
+            latest = conn.execute('SELECT MAX(id) FROM messages').fetchone()[0]
+        finally:
+            conn.close()
+        
+        names = cached_usernames()
+        totals = {'messages_sent': 0, 'messages_received': 0, 'uploads': 0, 'upload_bytes': 0}
+        days = []
+        for day, row_user_id, sent, received, uploads, upload_bytes in rows:
+            days.append({'day': day, 'user_id': row_user_id,
+                         'username': names.get(row_user_id, f'User {row_user_id}'),
+                         'messages_sent': sent, 'messages_received': received,
+                         'uploads': uploads, 'upload_bytes': upload_bytes})
+            totals['messages_sent'] += sent
+            totals['messages_received'] += received
+            totals['uploads'] += uploads
+            totals['upload_bytes'] += upload_bytes
+        return jsonify({'days': days, 'totals': totals,
+                        'counted_through_id': counted[0] if counted else None,
+                        'latest_message_id': latest})
+    except Exception as e:
+        print(f"❌ Daily stats error: {str(e)}")
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+def upload_quota_key(user_id):
+    """Quota bucket for an upload: the user, or the client address when no user_id is sent"""
+    return user_id if user_id is not None else f'addr:{request.remote_addr}'
+
+def is_address_key(key):
+    return isinstance(key, str) and key.startswith('addr:')
+
 @app.route('/api/upload', methods=['POST'])
+@rate_limited('upload')
 def upload_file():
     try:
         if 'file' not in request.files:
@@ -279,6 +1964,17 @@ def upload_file():
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
+        user_id = request.form.get('user_id', type=int)
+        quota_key = upload_quota_key(user_id)
+        quota = app.config['UPLOAD_QUOTA_BYTES']
+        # Until the sweeper's first pass has counted existing files, only the
+        # bytes uploaded since startup are known; enforce the quota on those
+        if quota:
+            with upload_usage_lock:
+                used = upload_usage.get(quota_key, 0)
+            if used + (request.content_length or 0) > quota:
+                return jsonify({'error': f'Upload quota exceeded ({used:,} of {quota:,} bytes used)'}), 413
+        
         if file:
             filename = secure_filename(file.filename)
             unique_filename = f"{uuid.uuid4()}_{filename}"
@@ -289,6 +1985,9 @@ def upload_file():
             
             try:
                 file.save(file_path)
+                with upload_usage_lock:
+                    pending_uploads[unique_filename] = quota_key
+                    upload_usage[quota_key] = upload_usage.get(quota_key, 0) + os.path.getsize(file_path)
                 print(f"✅ File saved successfully: {file_path}")
                 print(f"📄 File exists after save: {os.path.exists(file_path)}")
                 return jsonify({'file_path': unique_filename})
@@ -326,6 +2025,7 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     print('Client disconnected')
+    rate_limiter.forget(request.sid)
     # Remove user from connected_users and update last seen
     for user_id, sid in list(connected_users.items()):
         if sid == request.sid:
@@ -340,6 +2040,7 @@ def handle_disconnect():
             break
 
 @socketio.on('join')
+@rate_limited('join')
 def handle_join(data):
     user_id = data['user_id']
     connected_users[user_id] = request.sid
@@ -353,12 +2054,8 @@ def handle_join(data):
     }, broadcast=True)
 
 @socketio.on('send_message')
+@rate_limited('send_message')
 def handle_message(data):
-    # Ensure database exists
-    if not ensure_db_exists():
-        emit('error', {'message': 'Database not available'})
-        return
-        
     sender_id = data['sender_id']
     receiver_id = data['receiver_id']
     content = data['content']
@@ -397,38 +2094,58 @@ def handle_message(data):
 
 # WebRTC signaling events
 @socketio.on('offer')
+@rate_limited('offer')
 def handle_offer(data):
     emit('offer', data, broadcast=True, include_self=False)
 
 @socketio.on('answer')
+@rate_limited('answer')
 def handle_answer(data):
     emit('answer', data, broadcast=True, include_self=False)
 
 @socketio.on('ice-candidate')
+@rate_limited('ice-candidate')
 def handle_candidate(data):
     emit('ice-candidate', data, broadcast=True, include_self=False)
 
 @socketio.on('call_user')
+@rate_limited('call_user')
 def handle_call_user(data):
     receiver_id = data['receiver_id']
     if receiver_id in connected_users:
         emit('incoming_call', data, room=connected_users[receiver_id])
 
 @socketio.on('call_accepted')
+@rate_limited('call_accepted')
 def handle_call_accepted(data):
     caller_id = data['caller_id']
     if caller_id in connected_users:
         emit('call_accepted', data, room=connected_users[caller_id])
 
 @socketio.on('call_rejected')
+@rate_limited('call_rejected')
 def handle_call_rejected(data):
     caller_id = data['caller_id']
     if caller_id in connected_users:
         emit('call_rejected', data, room=connected_users[caller_id])
 
+@socketio.on('get_ice_servers')
+@rate_limited('ice_servers')
+def handle_get_ice_servers(data=None):
+    # Returned as the Socket.IO acknowledgement; TURN credentials only for the
+    # user joined on this socket
+    data = data if isinstance(data, dict) else {}
+    return ice_servers_for(joined_user_id(request.sid, data.get('user_id')))
+
+@socketio.on('call_stats')
+@rate_limited('call_stats')
+def handle_call_stats(data):
+    # Ingestion only queues the sample; call_stats_loop writes the rollups
+    enqueue_call_stats(data, joined_user_id(request.sid))
+
 if __name__ == '__main__':
     print("🚀 Starting main chat app...")
-    init_db()
+    create_app()
     
     # Get port from environment (Render provides PORT env var)
     port = int(os.environ.get('PORT', 5001))
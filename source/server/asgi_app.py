@@ -0,0 +1,210 @@
+"""Asyncio deployment mode: python-socketio AsyncServer on an ASGI server.
+
+The HTTP routes are the Flask app from app.py (served through a WSGI adapter),
+and the Socket.IO events are re-implemented as coroutines that share app.py's
+connected_users/user_last_seen/rate_limiter state. Chat handlers use a single
+aiosqlite connection, so a slow INSERT never blocks the event loop and one
+process can hold tens of thousands of idle WebSocket connections.
+
+Run with:
+    uvicorn source.server.asgi_app:asgi_app --host 0.0.0.0 --port $PORT
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+import aiosqlite
+import socketio
+from asgiref.wsgi import WsgiToAsgi
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from source.server import app as chat
+
+sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*',
+                           serializer=chat.app.config['SOCKETIO_SERIALIZER'],
+                           http_compression=True,
+                           compression_threshold=chat.app.config['SOCKETIO_COMPRESSION_THRESHOLD'])
+
+# Shared aiosqlite connection, opened on ASGI startup. Every coroutine writes
+# through it, so one transaction is open at a time: db_write_lock is held from
+# the INSERT to its commit/rollback, and a rollback only ever undoes its own row.
+db = None
+db_write_lock = asyncio.Lock()
+
+async def open_db():
+    global db
+    chat.create_app()
+    db = await aiosqlite.connect(chat.DATABASE_PATH)
+    print(f"✅ Async database ready: {chat.DATABASE_PATH}")
+
+async def close_db():
+    global db
+    if db is not None:
+        await db.close()
+        db = None
+
+def rate_limited(event):
+    """Async counterpart of app.rate_limited for (sid, data) handlers"""
+    def decorator(f):
+        async def wrapper(sid, *args):
+            wait = chat.rate_limiter.acquire(sid, event)
+            if wait is None:
+                if chat.rate_limiter.limits[event].get('notify'):
+                    data = args[0] if args and isinstance(args[0], dict) else {}
+                    await sio.emit('error', {
+                        'message': 'Rate limit exceeded, please slow down',
+                        'event': event,
+                        'client_message_id': data.get('client_message_id')
+                    }, to=sid)
+                return None
+            if wait:
+                await asyncio.sleep(wait)
+            return await f(sid, *args)
+        wrapper.__name__ = f.__name__
+        return wrapper
+    return decorator
+
+@sio.on('connect')
+async def handle_connect(sid, environ):
+    print('Client connected')
+
+@sio.on('disconnect')
+async def handle_disconnect(sid):
+    print('Client disconnected')
+    chat.rate_limiter.forget(sid)
+    for user_id, user_sid in list(chat.connected_users.items()):
+        if user_sid == sid:
+            del chat.connected_users[user_id]
+            chat.user_last_seen[user_id] = datetime.now().isoformat()
+            await sio.emit('user_status_changed', {
+                'user_id': user_id,
+                'status': 'offline',
+                'last_seen': chat.user_last_seen[user_id]
+            })
+            break
+
+@sio.on('join')
+@rate_limited('join')
+async def handle_join(sid, data):
+    user_id = data['user_id']
+    chat.connected_users[user_id] = sid
+    chat.user_last_seen[user_id] = datetime.now().isoformat()
+
+    await sio.emit('user_status_changed', {
+        'user_id': user_id,
+        'status': 'online',
+        'last_seen': chat.user_last_seen[user_id]
+    })
+
+@sio.on('send_message')
+@rate_limited('send_message')
+async def handle_message(sid, data):
+    if db is None:
+        await sio.emit('error', {'message': 'Database not available'}, to=sid)
+        return
+
+    sender_id = data['sender_id']
+    receiver_id = data['receiver_id']
+    content = data['content']
+    message_type = data.get('message_type', 'text')
+    file_path = data.get('file_path')
+
+    # The connection is shared by every coroutine: a failed statement must not
+    # leave its transaction open for the next sender's commit()
+    try:
+        async with db_write_lock:
+            try:
+                cursor = await db.execute('''
+                    INSERT INTO messages (sender_id, receiver_id, content, message_type, file_path)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (sender_id, receiver_id, content, message_type, file_path))
+                message_id = cursor.lastrowid
+
+                async with db.execute('SELECT username FROM users WHERE id = ?', (sender_id,)) as cursor:
+                    sender_result = await cursor.fetchone()
+                sender_name = sender_result[0] if sender_result else f'User {sender_id}'
+
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+    except Exception as e:
+        print(f"❌ Send message error: {str(e)}")
+        await sio.emit('error', {
+            'message': 'Message could not be saved, please retry',
+            'client_message_id': data.get('client_message_id')
+        }, to=sid)
+        return
+
+    if receiver_id in chat.connected_users:
+        await sio.emit('new_message', {
+            'id': message_id,
+            'sender_id': sender_id,
+            'receiver_id': receiver_id,
+            'content': content,
+            'message_type': message_type,
+            'file_path': file_path,
+            'sender_name': sender_name,
+            'created_at': datetime.now().isoformat()
+        }, to=chat.connected_users[receiver_id])
+
+# WebRTC signaling events
+@sio.on('offer')
+@rate_limited('offer')
+async def handle_offer(sid, data):
+    await sio.emit('offer', data, skip_sid=sid)
+
+@sio.on('answer')
+@rate_limited('answer')
+async def handle_answer(sid, data):
+    await sio.emit('answer', data, skip_sid=sid)
+
+@sio.on('ice-candidate')
+@rate_limited('ice-candidate')
+async def handle_candidate(sid, data):
+    await sio.emit('ice-candidate', data, skip_sid=sid)
+
+@sio.on('call_user')
+@rate_limited('call_user')
+async def handle_call_user(sid, data):
+    receiver_id = data['receiver_id']
+    if receiver_id in chat.connected_users:
+        await sio.emit('incoming_call', data, to=chat.connected_users[receiver_id])
+
+@sio.on('call_accepted')
+@rate_limited('call_accepted')
+async def handle_call_accepted(sid, data):
+    caller_id = data['caller_id']
+    if caller_id in chat.connected_users:
+        await sio.emit('call_accepted', data, to=chat.connected_users[caller_id])
+
+@sio.on('call_rejected')
+@rate_limited('call_rejected')
+async def handle_call_rejected(sid, data):
+    caller_id = data['caller_id']
+    if caller_id in chat.connected_users:
+        await sio.emit('call_rejected', data, to=chat.connected_users[caller_id])
+
+@sio.on('get_ice_servers')
+@rate_limited('ice_servers')
+async def handle_get_ice_servers(sid, data=None):
+    data = data if isinstance(data, dict) else {}
+    return chat.ice_servers_for(chat.joined_user_id(sid, data.get('user_id')))
+
+@sio.on('call_stats')
+@rate_limited('call_stats')
+async def handle_call_stats(sid, data):
+    chat.enqueue_call_stats(data, chat.joined_user_id(sid))
+
+asgi_app = socketio.ASGIApp(sio, other_asgi_app=WsgiToAsgi(chat.app),
+                            on_startup=open_db, on_shutdown=close_db)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print("🚀 Starting chat app (asyncio mode)...")
+    port = int(os.environ.get('PORT', 5001))
+    uvicorn.run(asgi_app, host='0.0.0.0', port=port)
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from source.server import app as chat
+
+
+@pytest.fixture
+def chat_db(tmp_path, monkeypatch):
+    """Point app.py at a fresh, migrated database in tmp_path; returns its path"""
+    db_path = str(tmp_path / 'messenger.db')
+    monkeypatch.setattr(chat, 'DATABASE_PATH', db_path)
+    monkeypatch.setitem(chat.app.config, 'ARCHIVE_DIR', str(tmp_path / 'archive'))
+    monkeypatch.setitem(chat.app.config, 'UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    assert chat.ensure_db_exists()
+    return db_path
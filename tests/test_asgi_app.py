@@ -0,0 +1,47 @@
+import asyncio
+import sqlite3
+
+import aiosqlite
+
+from source.server import app as chat
+from source.server import asgi_app
+
+
+def test_failed_insert_does_not_roll_back_concurrent_sender(chat_db, monkeypatch):
+    conn = sqlite3.connect(chat_db)
+    conn.execute('''
+        CREATE TRIGGER reject_boom BEFORE INSERT ON messages WHEN NEW.content = 'boom'
+        BEGIN SELECT RAISE(ABORT, 'boom rejected'); END
+    ''')
+    conn.commit()
+    conn.close()
+
+    emitted = []
+
+    async def fake_emit(event, data=None, to=None, **kwargs):
+        emitted.append((event, data, to))
+
+    monkeypatch.setattr(asgi_app.sio, 'emit', fake_emit)
+    monkeypatch.delitem(chat.rate_limiter.limits, 'send_message', raising=False)
+    monkeypatch.setattr(chat, 'connected_users', {2: 'receiver-sid'})
+
+    async def run():
+        asgi_app.db = await aiosqlite.connect(chat_db)
+        try:
+            await asyncio.gather(
+                asgi_app.handle_message('bad-sid', {'sender_id': 1, 'receiver_id': 2, 'content': 'boom',
+                                                    'client_message_id': 'c-boom'}),
+                asgi_app.handle_message('ok-sid', {'sender_id': 3, 'receiver_id': 2, 'content': 'ok',
+                                                   'client_message_id': 'c-ok'}),
+            )
+        finally:
+            await asgi_app.close_db()
+
+    asyncio.run(run())
+
+    stored = sqlite3.connect(chat_db).execute('SELECT sender_id, content FROM messages').fetchall()
+    assert stored == [(3, 'ok')]
+    assert ('error', {'message': 'Message could not be saved, please retry',
+                      'client_message_id': 'c-boom'}, 'bad-sid') in emitted
+    delivered = [data for event, data, to in emitted if event == 'new_message']
+    assert [m['content'] for m in delivered] == ['ok']
@@ -0,0 +1,56 @@
+import fcntl
+import multiprocessing
+import os
+import sqlite3
+
+from source.server import app as chat
+
+
+def fill_messages(db_path, count):
+    conn = sqlite3.connect(db_path)
+    conn.executemany('INSERT INTO messages (sender_id, receiver_id, content) VALUES (1, 2, ?)',
+                     [('x' * 200,) for _ in range(count)])
+    conn.commit()
+    conn.close()
+
+
+def backup_worker(db_path, target_path, errors):
+    try:
+        chat.backup_database(db_path, target_path, pages_per_step=16, step_sleep=0)
+    except Exception as e:
+        errors.put(repr(e))
+
+
+def test_concurrent_backups_do_not_share_a_temp_file(chat_db, tmp_path):
+    fill_messages(chat_db, 20000)
+    target_path = str(tmp_path / 'backup' / 'messenger.db')
+    os.makedirs(os.path.dirname(target_path))
+
+    ctx = multiprocessing.get_context('fork')
+    errors = ctx.Queue()
+    procs = [ctx.Process(target=backup_worker, args=(chat_db, target_path, errors)) for _ in range(4)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+
+    assert errors.empty(), errors.get()
+    assert sorted(os.listdir(os.path.dirname(target_path))) == ['messenger.db']
+    conn = sqlite3.connect(target_path)
+    assert conn.execute('SELECT COUNT(*) FROM messages').fetchone()[0] == 20000
+    conn.close()
+
+
+def test_backup_once_skips_while_another_worker_holds_the_lock(chat_db, tmp_path, monkeypatch):
+    backup_path = str(tmp_path / 'messenger.backup.db')
+    monkeypatch.setitem(chat.app.config, 'BACKUP_PATH', backup_path)
+    monkeypatch.setitem(chat.app.config, 'BACKUP_INTERVAL', 3600)
+
+    with open(backup_path + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        assert chat.backup_once() is None
+    assert not os.path.exists(backup_path)
+
+    assert chat.backup_once() is not None
+    # A worker whose timer fires right after does not copy again
+    assert chat.backup_once() is None
@@ -0,0 +1,18 @@
+from source.server import app as chat
+
+
+def test_call_stats_are_filed_under_the_joined_user(chat_db, monkeypatch):
+    monkeypatch.setattr(chat, 'call_stats_queue', chat.collections.deque())
+    monkeypatch.setattr(chat, 'connected_users', {})
+    monkeypatch.delitem(chat.rate_limiter.limits, 'call_stats', raising=False)
+    joined = chat.socketio.test_client(chat.app)
+    anonymous = chat.socketio.test_client(chat.app)
+    try:
+        joined.emit('join', {'user_id': 5})
+        joined.emit('call_stats', {'call_id': 'c1', 'user_id': 99, 'rtt_ms': 40})
+        anonymous.emit('call_stats', {'call_id': 'c1', 'user_id': 5, 'rtt_ms': 40})
+    finally:
+        joined.disconnect()
+        anonymous.disconnect()
+
+    assert [sample['user_id'] for _, sample in chat.call_stats_queue] == [5, 0]
@@ -0,0 +1,36 @@
+import multiprocessing
+import sqlite3
+
+from source.server import app as chat
+
+
+def stats_worker(errors):
+    try:
+        chat.update_daily_stats(batch_size=500)
+    except Exception as e:
+        errors.put(repr(e))
+
+
+def test_concurrent_workers_count_each_message_once(chat_db):
+    conn = sqlite3.connect(chat_db)
+    conn.executemany('INSERT INTO messages (sender_id, receiver_id, content) VALUES (?, ?, ?)',
+                     [(i % 7, (i + 1) % 7, 'hi') for i in range(20000)])
+    conn.commit()
+    conn.close()
+
+    ctx = multiprocessing.get_context('fork')
+    errors = ctx.Queue()
+    procs = [ctx.Process(target=stats_worker, args=(errors,)) for _ in range(4)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+
+    assert errors.empty(), errors.get()
+    conn = sqlite3.connect(chat_db)
+    sent, received = conn.execute(
+        'SELECT SUM(messages_sent), SUM(messages_received) FROM daily_user_stats').fetchone()
+    assert (sent, received) == (20000, 20000)
+    assert conn.execute("SELECT value FROM analytics_state WHERE name = 'daily_stats_last_id'"
+                        ).fetchone()[0] == 20000
+    conn.close()
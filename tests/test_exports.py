@@ -0,0 +1,36 @@
+import pytest
+
+from source.server import app as chat
+
+TOKEN = {'X-Export-Token': 'secret'}
+
+
+@pytest.fixture
+def client(chat_db, tmp_path, monkeypatch):
+    monkeypatch.setitem(chat.app.config, 'EXPORT_DIR', str(tmp_path / 'exports'))
+    monkeypatch.setitem(chat.app.config, 'EXPORT_TOKEN', 'secret')
+    monkeypatch.setattr(chat, 'export_jobs', {})
+    return chat.app.test_client()
+
+
+def test_analytics_needs_the_export_token(client, monkeypatch):
+    assert client.get('/api/analytics/daily').status_code == 401
+    assert client.get('/api/analytics/daily', headers={'X-Export-Token': 'wrong'}).status_code == 401
+    assert client.get('/api/analytics/daily', headers=TOKEN).status_code == 200
+    monkeypatch.setitem(chat.app.config, 'EXPORT_TOKEN', None)
+    assert client.get('/api/analytics/daily', headers=TOKEN).status_code == 403
+
+
+def test_export_status_is_served_by_other_workers(client):
+    job = chat.new_export_job(fmt='csv')
+    chat.run_export(job)
+    # Another worker has nothing in its export_jobs; it reads the status file
+    chat.export_jobs.clear()
+
+    info = client.get(f"/api/exports/{job['id']}", headers=TOKEN).get_json()
+    assert info['status'] == 'done'
+    assert 'path' not in info
+    download = client.get(info['download_url'], headers=TOKEN)
+    assert download.status_code == 200
+    assert download.data.startswith(b'id,sender_id')
+    assert client.get('/api/exports/../../etc', headers=TOKEN).status_code == 404
@@ -0,0 +1,30 @@
+import io
+
+from source.server import app as chat
+
+
+def test_upload_stats_do_not_publish_client_addresses(chat_db, tmp_path, monkeypatch):
+    upload_dir = tmp_path / 'uploads'
+    upload_dir.mkdir()
+    monkeypatch.setitem(chat.app.config, 'UPLOAD_QUOTA_BYTES', 10000)
+    monkeypatch.delitem(chat.rate_limiter.limits, 'upload', raising=False)
+    monkeypatch.setattr(chat, 'upload_usage', {})
+    monkeypatch.setattr(chat, 'pending_uploads', {})
+    monkeypatch.setattr(chat, 'last_upload_sweep', {})
+    client = chat.app.test_client()
+
+    response = client.post('/api/upload', data={'file': (io.BytesIO(b'x' * 150), 'a.txt')},
+                           content_type='multipart/form-data',
+                           environ_base={'REMOTE_ADDR': '203.0.113.7'})
+    assert response.status_code == 200
+    assert chat.upload_usage == {'addr:203.0.113.7': 150}
+
+    # The quota is lowered afterwards so the sweep reports the client over it
+    monkeypatch.setitem(chat.app.config, 'UPLOAD_QUOTA_BYTES', 100)
+    chat.sweep_uploads()
+    stats = client.get('/api/uploads/stats').get_json()
+    assert '203.0.113.7' not in str(stats)
+    assert stats['usage_bytes'] == {}
+    assert stats['anonymous_usage_bytes'] == 150
+    assert stats['last_sweep']['users_over_quota'] == []
+    assert stats['last_sweep']['anonymous_over_quota'] == 1